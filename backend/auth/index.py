@@ -1,129 +1,468 @@
+import base64
+import gzip
+import hmac
 import json
+import math
 import os
+import select
+import threading
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from functools import wraps
 import hashlib
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'scrypt')
+SCRYPT_N = int(os.environ.get('SCRYPT_N', '16384'))
+SCRYPT_R = int(os.environ.get('SCRYPT_R', '8'))
+SCRYPT_P = int(os.environ.get('SCRYPT_P', '1'))
+PBKDF2_ITERATIONS = int(os.environ.get('PBKDF2_ITERATIONS', '600000'))
+SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', str(7 * 24 * 3600)))
+
+LOGIN_RATE_CAPACITY = int(os.environ.get('LOGIN_RATE_CAPACITY', '10'))
+LOGIN_RATE_REFILL_SECONDS = float(os.environ.get('LOGIN_RATE_REFILL_SECONDS', '30'))
+LOGIN_RATE_MAX_KEYS = 10000
+LOGIN_RATE_PRUNE_SECONDS = 600
+EMAIL_MAX_LENGTH = 255
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_MAX_IDLE_SECONDS = float(os.environ.get('DB_POOL_MAX_IDLE_SECONDS', '300'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+RESPONSE_COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+RESPONSE_GZIP_LEVEL = 6
+RESPONSE_BROTLI_QUALITY = 5
+
+_db_pool = []
+_db_pool_lock = threading.Lock()
+
+def _close_quietly(conn):
+    """Закрывает соединение, игнорируя ошибки"""
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _is_connection_alive(conn) -> bool:
+    """Проверяет, что соединение из пула еще живо"""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _has_pending_input(conn) -> bool:
+    """Без запроса к серверу проверяет, не закрыл ли сервер соединение: живому соединению в простое читать нечего"""
+    try:
+        readable, _, _ = select.select([conn], [], [], 0)
+    except (OSError, ValueError, psycopg2.Error):
+        return True
+    return bool(readable)
+
 def get_db_connection():
-    """Создает подключение к базе данных"""
+    """Берет теплое соединение из пула или создает новое"""
+    while True:
+        with _db_pool_lock:
+            if not _db_pool:
+                break
+            conn, released_at = _db_pool.pop()
+        idle_seconds = time.monotonic() - released_at
+        if conn.closed or idle_seconds > DB_POOL_MAX_IDLE_SECONDS or _has_pending_input(conn):
+            _close_quietly(conn)
+            continue
+        if idle_seconds > DB_POOL_HEALTHCHECK_SECONDS and not _is_connection_alive(conn):
+            _close_quietly(conn)
+            continue
+        return conn
     return psycopg2.connect(os.environ['DATABASE_URL'])
 
+def release_db_connection(conn):
+    """Возвращает соединение в пул между вызовами, сломанные и лишние закрывает"""
+    if conn.closed:
+        return
+    try:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        _close_quietly(conn)
+        return
+    
+    now = time.monotonic()
+    evicted = []
+    with _db_pool_lock:
+        alive = []
+        for pooled, released_at in _db_pool:
+            if now - released_at > DB_POOL_MAX_IDLE_SECONDS:
+                evicted.append(pooled)
+            else:
+                alive.append((pooled, released_at))
+        _db_pool[:] = alive
+        if len(_db_pool) < DB_POOL_MAX_SIZE:
+            _db_pool.append((conn, now))
+        else:
+            evicted.append(conn)
+    for stale in evicted:
+        _close_quietly(stale)
+
+def encode_json_value(value):
+    """Приводит типы из строк БД к JSON: Decimal в число, дату и время в ISO 8601"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def dumps_json(data) -> str:
+    """Сериализует данные ответа через orjson, если он установлен, иначе стандартным json"""
+    if orjson is not None:
+        return orjson.dumps(data, default=encode_json_value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, default=encode_json_value, ensure_ascii=False, separators=(',', ':'))
+
+def build_response(status_code: int, body: str, headers: dict = None, is_base64: bool = False) -> dict:
+    """Ответ функции с CORS и JSON по умолчанию; headers дополняют или заменяют заголовки"""
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', **(headers or {})},
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
+
+def json_response(status_code: int, data, headers: dict = None) -> dict:
+    """JSON-ответ функции"""
+    return build_response(status_code, dumps_json(data), headers)
+
+def accepted_encodings(event: dict) -> set:
+    """Кодировки сжатия из Accept-Encoding, кроме отключенных через q=0"""
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    encodings = set()
+    for part in (headers.get('accept-encoding') or '').split(','):
+        name, _, params = part.partition(';')
+        if params.replace(' ', '').lower() in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+def compress_response(event: dict, response: dict) -> dict:
+    """Сжимает текстовое тело ответа br или gzip, если оно больше порога и клиент это принимает"""
+    body = response.get('body')
+    headers = response.get('headers') or {}
+    if response.get('isBase64Encoded') or not body or 'Content-Encoding' in headers:
+        return response
+    data = body.encode()
+    if len(data) < RESPONSE_COMPRESS_MIN_BYTES:
+        return response
+    
+    encodings = accepted_encodings(event)
+    if brotli is not None and 'br' in encodings:
+        encoding, compressed = 'br', brotli.compress(data, quality=RESPONSE_BROTLI_QUALITY)
+    elif 'gzip' in encodings:
+        encoding, compressed = 'gzip', gzip.compress(data, compresslevel=RESPONSE_GZIP_LEVEL)
+    else:
+        return response
+    return {
+        **response,
+        'headers': {**headers, 'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'},
+        'body': base64.b64encode(compressed).decode(),
+        'isBase64Encoded': True
+    }
+
+def compressed_responses(handler_func):
+    """Сжимает крупные ответы обработчика по Accept-Encoding клиента"""
+    @wraps(handler_func)
+    def wrapper(event: dict, context):
+        return compress_response(event, handler_func(event, context))
+    return wrapper
+
+def _b64url_encode(data: bytes) -> str:
+    """Кодирует байты в base64url без выравнивания"""
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64url_decode(data: str) -> bytes:
+    """Декодирует base64url без выравнивания"""
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def _sign_session_payload(payload: str) -> str:
+    """Подписывает полезную нагрузку токена сессии секретом SESSION_SECRET"""
+    secret = os.environ['SESSION_SECRET'].encode()
+    return _b64url_encode(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    """Считает scrypt с памятью, достаточной для заданной стоимости"""
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+def _hash_scrypt(password: str) -> str:
+    """Хеширует пароль scrypt с текущей стоимостью"""
+    salt = os.urandom(16)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64url_encode(salt)}${_b64url_encode(digest)}"
+
+def _verify_scrypt(password: str, parts: list) -> bool:
+    """Проверяет пароль по хешу scrypt$n$r$p$salt$digest"""
+    n, r, p, salt, digest = parts[1:]
+    return hmac.compare_digest(_scrypt(password, _b64url_decode(salt), int(n), int(r), int(p)), _b64url_decode(digest))
+
+def _hash_pbkdf2(password: str) -> str:
+    """Хеширует пароль PBKDF2-SHA256 с текущим числом итераций"""
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64url_encode(salt)}${_b64url_encode(digest)}"
+
+def _verify_pbkdf2(password: str, parts: list) -> bool:
+    """Проверяет пароль по хешу pbkdf2_sha256$iterations$salt$digest"""
+    iterations, salt, digest = parts[1:]
+    return hmac.compare_digest(
+        hashlib.pbkdf2_hmac('sha256', password.encode(), _b64url_decode(salt), int(iterations)),
+        _b64url_decode(digest)
+    )
+
+PASSWORD_HASHERS = {
+    'scrypt': (_hash_scrypt, _verify_scrypt, lambda parts: parts[1:4] == [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]),
+    'pbkdf2_sha256': (_hash_pbkdf2, _verify_pbkdf2, lambda parts: parts[1] == str(PBKDF2_ITERATIONS)),
+}
+
 def hash_password(password: str) -> str:
-    """Хеширует пароль"""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Хеширует пароль алгоритмом PASSWORD_HASHER со случайной солью"""
+    return PASSWORD_HASHERS[PASSWORD_HASHER][0](password)
+
+def verify_password(password: str, stored_hash: str) -> bool:
+    """Проверяет пароль, включая старые несоленые хеши sha256"""
+    parts = stored_hash.split('$')
+    hasher = PASSWORD_HASHERS.get(parts[0])
+    if hasher:
+        try:
+            return hasher[1](password, parts)
+        except ValueError:
+            return False
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_hash)
+
+def password_needs_rehash(stored_hash: str) -> bool:
+    """Нужно ли перехешировать пароль текущим алгоритмом и стоимостью"""
+    parts = stored_hash.split('$')
+    return parts[0] != PASSWORD_HASHER or not PASSWORD_HASHERS[PASSWORD_HASHER][2](parts)
+
+def issue_session_token(user: dict) -> str:
+    """Выдает подписанный токен сессии, который другие функции проверяют без БД"""
+    payload = _b64url_encode(json.dumps({
+        'uid': user['id'],
+        'adm': bool(user['is_admin']),
+        'exp': int(time.time()) + SESSION_TTL_SECONDS
+    }, separators=(',', ':')).encode())
+    return f"{payload}.{_sign_session_payload(payload)}"
+
+_login_buckets = OrderedDict()
+_login_buckets_lock = threading.Lock()
+_login_rate_state = {'pruned_at': 0.0}
+
+def get_client_ip(event: dict):
+    """IP клиента из контекста запроса платформы; X-Forwarded-For задает клиент, поэтому ему не доверяем"""
+    return ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp') or None
+
+def normalize_email(email: str) -> str:
+    """Ключ email для поиска и уникальности: без пробелов по краям и в нижнем регистре"""
+    return str(email or '').strip().lower()
+
+def find_login_user(cursor, email: str, password: str):
+    """Ищет пользователя по нормализованному email и проверяет пароль.
+    
+    Адреса, которые V0016 не смогла привести к нижнему регистру из-за совпадений,
+    проверяются запасным запросом по частичному индексу idx_users_email_unnormalized.
+    """
+    cursor.execute(
+        "SELECT id, email, name, phone, is_admin, password_hash FROM users WHERE email = %s",
+        (email,)
+    )
+    user = cursor.fetchone()
+    if user and verify_password(password, user['password_hash']):
+        return user
+    
+    cursor.execute(
+        """SELECT id, email, name, phone, is_admin, password_hash FROM users
+           WHERE LOWER(TRIM(email)) = %s AND email <> LOWER(TRIM(email))
+           ORDER BY id""",
+        (email,)
+    )
+    for candidate in cursor.fetchall():
+        if verify_password(password, candidate['password_hash']):
+            return candidate
+    return None
+
+def login_rate_keys(event: dict, email: str) -> list:
+    """Ключи ограничителя попыток входа: IP клиента, если его передала платформа, и нормализованный email"""
+    client_ip = get_client_ip(event)
+    keys = ['ip:' + client_ip] if client_ip else []
+    if email:
+        keys.append('email:' + email)
+    return keys
+
+def _refilled_tokens(tokens: float, updated_at: float, now: float) -> float:
+    """Число жетонов в корзине с учетом пополнения за прошедшее время"""
+    return min(LOGIN_RATE_CAPACITY, tokens + (now - updated_at) / LOGIN_RATE_REFILL_SECONDS)
 
+def take_local_login_tokens(keys: list) -> float:
+    """Списывает по жетону из корзин этого экземпляра; возвращает 0 или сколько секунд ждать"""
+    now = time.monotonic()
+    with _login_buckets_lock:
+        tokens = {}
+        for key in keys:
+            bucket = _login_buckets.get(key)
+            tokens[key] = _refilled_tokens(*bucket, now) if bucket else LOGIN_RATE_CAPACITY
+        shortage = max(1 - value for value in tokens.values())
+        spent = 1 if shortage <= 0 else 0
+        for key, value in tokens.items():
+            _login_buckets[key] = (value - spent, now)
+            _login_buckets.move_to_end(key)
+        while len(_login_buckets) > LOGIN_RATE_MAX_KEYS:
+            _login_buckets.popitem(last=False)
+    return 0 if spent else shortage * LOGIN_RATE_REFILL_SECONDS
+
+def sync_local_login_tokens(remote_tokens: dict):
+    """Опускает локальные корзины до общего остатка, чтобы следующие отказы обходились без БД"""
+    now = time.monotonic()
+    with _login_buckets_lock:
+        for key, remote in remote_tokens.items():
+            bucket = _login_buckets.get(key)
+            local = _refilled_tokens(*bucket, now) if bucket else LOGIN_RATE_CAPACITY
+            _login_buckets[key] = (min(local, remote), now)
+
+def take_shared_login_tokens(cursor, keys: list) -> float:
+    """Списывает по жетону из общих корзин в БД одним запросом; возвращает 0 или сколько секунд ждать"""
+    cursor.execute(
+        """
+        INSERT INTO login_rate_limits (key, tokens, updated_at)
+        SELECT key, %s, now() FROM unnest(%s::varchar[]) AS key
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = GREATEST(LEAST(%s, login_rate_limits.tokens
+                + EXTRACT(EPOCH FROM now() - login_rate_limits.updated_at) / %s) - 1, -1),
+            updated_at = now()
+        RETURNING key, tokens
+        """,
+        (LOGIN_RATE_CAPACITY - 1, keys, LOGIN_RATE_CAPACITY, LOGIN_RATE_REFILL_SECONDS)
+    )
+    remote_tokens = {row['key']: row['tokens'] for row in cursor.fetchall()}
+    
+    now = time.monotonic()
+    if now - _login_rate_state['pruned_at'] > LOGIN_RATE_PRUNE_SECONDS:
+        _login_rate_state['pruned_at'] = now
+        cursor.execute(
+            "DELETE FROM login_rate_limits WHERE updated_at < now() - %s * interval '1 second'",
+            (LOGIN_RATE_CAPACITY * LOGIN_RATE_REFILL_SECONDS,)
+        )
+    
+    sync_local_login_tokens(remote_tokens)
+    shortage = -min(remote_tokens.values())
+    return 0 if shortage <= 0 else shortage * LOGIN_RATE_REFILL_SECONDS
+
+def too_many_attempts_response(retry_after: float) -> dict:
+    """Ответ 429 с подсказкой, через сколько секунд повторить вход"""
+    return json_response(429, {'error': 'Слишком много попыток входа, попробуйте позже'}, headers={'Retry-After': str(math.ceil(retry_after))})
+
+@compressed_responses
 def handler(event: dict, context):
     """API для авторизации и регистрации пользователей"""
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return build_response(200, '', headers={
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, Authorization'
+        })
     
     try:
+        body = json.loads(event.get('body') or '{}') if method == 'POST' else {}
+        action = body.get('action')
+        
+        if action in ('login', 'register') and not os.environ.get('SESSION_SECRET'):
+            return json_response(500, {'error': 'Не задан секрет SESSION_SECRET: вход и регистрация недоступны'})
+        
+        if action in ('login', 'register') and len(normalize_email(body.get('email', ''))) > EMAIL_MAX_LENGTH:
+            return json_response(400, {'error': f'Email не может быть длиннее {EMAIL_MAX_LENGTH} символов'})
+        
+        if action == 'login':
+            rate_keys = login_rate_keys(event, normalize_email(body.get('email', '')))
+            retry_after = take_local_login_tokens(rate_keys) if rate_keys else 0
+            if retry_after:
+                return too_many_attempts_response(retry_after)
+        
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
-            
             if action == 'login':
-                email = body.get('email', '').strip()
+                email = normalize_email(body.get('email', ''))
                 password = body.get('password', '')
                 
                 if not email or not password:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Email и пароль обязательны'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'Email и пароль обязательны'})
                 
-                password_hash = hash_password(password)
-                cursor.execute(
-                    "SELECT id, email, name, phone, is_admin FROM users WHERE email = %s AND password_hash = %s",
-                    (email, password_hash)
-                )
-                user = cursor.fetchone()
+                retry_after = take_shared_login_tokens(cursor, rate_keys)
+                conn.commit()
+                if retry_after:
+                    return too_many_attempts_response(retry_after)
+                
+                user = find_login_user(cursor, email, password)
                 
                 if user:
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'success': True, 'user': dict(user)}),
-                        'isBase64Encoded': False
-                    }
+                    user = dict(user)
+                    stored_hash = user.pop('password_hash')
+                    if password_needs_rehash(stored_hash):
+                        cursor.execute(
+                            "UPDATE users SET password_hash = %s WHERE id = %s",
+                            (hash_password(password), user['id'])
+                        )
+                        conn.commit()
+                    
+                    return json_response(200, {'success': True, 'user': user, 'token': issue_session_token(user)})
                 else:
-                    return {
-                        'statusCode': 401,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Неверный email или пароль'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(401, {'error': 'Неверный email или пароль'})
             
             elif action == 'register':
-                email = body.get('email', '').strip()
+                email = normalize_email(body.get('email', ''))
                 password = body.get('password', '')
                 name = body.get('name', '').strip()
                 phone = body.get('phone', '').strip()
                 
                 if not email or not password or not name:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Email, пароль и имя обязательны'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-                if cursor.fetchone():
-                    return {
-                        'statusCode': 409,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Пользователь с таким email уже существует'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'Email, пароль и имя обязательны'})
                 
                 password_hash = hash_password(password)
                 cursor.execute(
-                    "INSERT INTO users (email, password_hash, name, phone) VALUES (%s, %s, %s, %s) RETURNING id, email, name, phone, is_admin",
+                    """
+                    INSERT INTO users (email, password_hash, name, phone) VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (email) DO NOTHING
+                    RETURNING id, email, name, phone, is_admin
+                    """,
                     (email, password_hash, name, phone)
                 )
                 user = cursor.fetchone()
                 conn.commit()
                 
-                return {
-                    'statusCode': 201,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'user': dict(user)}),
-                    'isBase64Encoded': False
-                }
+                if not user:
+                    return json_response(409, {'error': 'Пользователь с таким email уже существует'})
+                
+                return json_response(201, {'success': True, 'user': dict(user), 'token': issue_session_token(user)})
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
+        return json_response(405, {'error': 'Метод не поддерживается'})
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        return json_response(500, {'error': str(e)})
     finally:
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
-            conn.close()
+            release_db_connection(conn)
@@ -1,229 +1,1227 @@
+import base64
+import csv
+import gzip
+import io
+import hashlib
+import hmac
 import json
+import math
 import os
+import select
+import re
+import threading
+import time
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from bisect import bisect_right
+from collections import Counter, OrderedDict
+from functools import lru_cache, wraps
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ORDERS_PAGE_DEFAULT_LIMIT = 50
+ORDERS_PAGE_MAX_LIMIT = 500
+ORDERS_EXPORT_ITERSIZE = 2000
+ORDERS_EXPORT_CHUNK_DEFAULT = 2000
+ORDERS_EXPORT_CHUNK_MAX = 5000
+ORDERS_BATCH_MAX_SIZE = 1000
+ORDERS_SEARCH_DEFAULT_LIMIT = 20
+USER_ORDERS_LIST_COLUMNS = (
+    'id', 'order_number', 'status', 'recipient_name', 'recipient_phone', 'weight', 'price', 'delivery_type', 'created_at'
+)
+ORDERS_SEARCH_MAX_LIMIT = 100
+ORDERS_SEARCH_MIN_LENGTH = 3
+QUOTE_CACHE_SIZE = 4096
+ORDER_DELIVERY_TYPES = ('home', 'pickup')
+ORDER_DECIMAL_MAX = 10 ** 8
+ORDER_FIELD_MAX_LENGTHS = {'recipient_name': 255, 'recipient_phone': 50}
+TARIFF_CACHE_TTL_SECONDS = float(os.environ.get('TARIFF_CACHE_TTL_SECONDS', '60'))
+DWELL_BUCKETS_PER_DOUBLING = 4
+STATUS_CACHE_TTL_SECONDS = float(os.environ.get('STATUS_CACHE_TTL_SECONDS', '30'))
+TRACKING_CACHE_SIZE = int(os.environ.get('TRACKING_CACHE_SIZE', '10000'))
+TRACKING_VERSION_CHECK_SECONDS = float(os.environ.get('TRACKING_VERSION_CHECK_SECONDS', '2'))
+ORDERS_EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_MAX_IDLE_SECONDS = float(os.environ.get('DB_POOL_MAX_IDLE_SECONDS', '300'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+RESPONSE_COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+RESPONSE_GZIP_LEVEL = 6
+RESPONSE_BROTLI_QUALITY = 5
+
+_db_pool = []
+_db_pool_lock = threading.Lock()
+
+def _close_quietly(conn):
+    """Закрывает соединение, игнорируя ошибки"""
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _is_connection_alive(conn) -> bool:
+    """Проверяет, что соединение из пула еще живо"""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _has_pending_input(conn) -> bool:
+    """Без запроса к серверу проверяет, не закрыл ли сервер соединение: живому соединению в простое читать нечего"""
+    try:
+        readable, _, _ = select.select([conn], [], [], 0)
+    except (OSError, ValueError, psycopg2.Error):
+        return True
+    return bool(readable)
 
 def get_db_connection():
-    """Создает подключение к базе данных"""
+    """Берет теплое соединение из пула или создает новое"""
+    while True:
+        with _db_pool_lock:
+            if not _db_pool:
+                break
+            conn, released_at = _db_pool.pop()
+        idle_seconds = time.monotonic() - released_at
+        if conn.closed or idle_seconds > DB_POOL_MAX_IDLE_SECONDS or _has_pending_input(conn):
+            _close_quietly(conn)
+            continue
+        if idle_seconds > DB_POOL_HEALTHCHECK_SECONDS and not _is_connection_alive(conn):
+            _close_quietly(conn)
+            continue
+        return conn
     return psycopg2.connect(os.environ['DATABASE_URL'])
 
+def release_db_connection(conn):
+    """Возвращает соединение в пул между вызовами, сломанные и лишние закрывает"""
+    if conn.closed:
+        return
+    try:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        _close_quietly(conn)
+        return
+    
+    now = time.monotonic()
+    evicted = []
+    with _db_pool_lock:
+        alive = []
+        for pooled, released_at in _db_pool:
+            if now - released_at > DB_POOL_MAX_IDLE_SECONDS:
+                evicted.append(pooled)
+            else:
+                alive.append((pooled, released_at))
+        _db_pool[:] = alive
+        if len(_db_pool) < DB_POOL_MAX_SIZE:
+            _db_pool.append((conn, now))
+        else:
+            evicted.append(conn)
+    for stale in evicted:
+        _close_quietly(stale)
+
+def encode_json_value(value):
+    """Приводит типы из строк БД к JSON: Decimal в число, дату и время в ISO 8601"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def dumps_json(data) -> str:
+    """Сериализует данные ответа через orjson, если он установлен, иначе стандартным json"""
+    if orjson is not None:
+        return orjson.dumps(data, default=encode_json_value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, default=encode_json_value, ensure_ascii=False, separators=(',', ':'))
+
+def build_response(status_code: int, body: str, headers: dict = None, is_base64: bool = False) -> dict:
+    """Ответ функции с CORS и JSON по умолчанию; headers дополняют или заменяют заголовки"""
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', **(headers or {})},
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
+
+def json_response(status_code: int, data, headers: dict = None) -> dict:
+    """JSON-ответ функции"""
+    return build_response(status_code, dumps_json(data), headers)
+
+def accepted_encodings(event: dict) -> set:
+    """Кодировки сжатия из Accept-Encoding, кроме отключенных через q=0"""
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    encodings = set()
+    for part in (headers.get('accept-encoding') or '').split(','):
+        name, _, params = part.partition(';')
+        if params.replace(' ', '').lower() in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+def compress_response(event: dict, response: dict) -> dict:
+    """Сжимает текстовое тело ответа br или gzip, если оно больше порога и клиент это принимает"""
+    body = response.get('body')
+    headers = response.get('headers') or {}
+    if response.get('isBase64Encoded') or not body or 'Content-Encoding' in headers:
+        return response
+    data = body.encode()
+    if len(data) < RESPONSE_COMPRESS_MIN_BYTES:
+        return response
+    
+    encodings = accepted_encodings(event)
+    if brotli is not None and 'br' in encodings:
+        encoding, compressed = 'br', brotli.compress(data, quality=RESPONSE_BROTLI_QUALITY)
+    elif 'gzip' in encodings:
+        encoding, compressed = 'gzip', gzip.compress(data, compresslevel=RESPONSE_GZIP_LEVEL)
+    else:
+        return response
+    return {
+        **response,
+        'headers': {**headers, 'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'},
+        'body': base64.b64encode(compressed).decode(),
+        'isBase64Encoded': True
+    }
+
+def compressed_responses(handler_func):
+    """Сжимает крупные ответы обработчика по Accept-Encoding клиента"""
+    @wraps(handler_func)
+    def wrapper(event: dict, context):
+        return compress_response(event, handler_func(event, context))
+    return wrapper
+
 def calculate_volumetric_weight(length: float, width: float, height: float, volume_factor: float = 5000) -> float:
     """Рассчитывает объемный вес"""
     return (length * width * height) / volume_factor
 
-def calculate_price(weight: float, length: float = None, width: float = None, height: float = None) -> float:
-    """Рассчитывает стоимость доставки с учетом габаритов"""
-    actual_weight = weight
+def compile_tariff(settings: dict, point_cities: dict = None) -> dict:
+    """Собирает из настроек таблицу тарифов для быстрого расчета без обращений к БД
+    
+    tariff_rules (JSON) может содержать:
+    weight_bands — [{"from": 0, "rate": 120}, {"from": 10, "rate": 100}], ₽/кг от указанного веса;
+    city_multipliers — {"Гагра": 1.1}, множитель по городу пункта выдачи;
+    delivery_type_surcharges — {"home": 100}, надбавка в ₽ по типу доставки.
+    """
+    rules = json.loads(settings.get('tariff_rules') or '{}')
+    bands = rules.get('weight_bands') or [
+        {'from': 0, 'rate': float(settings.get('tariff_standard', 120))},
+        {'from': 10, 'rate': float(settings.get('tariff_optimal', 100))},
+    ]
+    bands = sorted(bands, key=lambda band: float(band['from']))
+    city_multipliers = rules.get('city_multipliers', {})
     
+    return {
+        'volume_factor': float(settings.get('tariff_volume_factor', 5000)),
+        'band_starts': [float(band['from']) for band in bands],
+        'band_rates': [float(band['rate']) for band in bands],
+        'point_multipliers': {
+            point_id: float(city_multipliers[city])
+            for point_id, city in (point_cities or {}).items()
+            if city in city_multipliers
+        },
+        'delivery_type_surcharges': {
+            key: float(value) for key, value in rules.get('delivery_type_surcharges', {}).items()
+        },
+    }
+
+DEFAULT_TARIFF = compile_tariff({})
+
+_tariff_cache = {'tariff': None, 'version': None, 'checked_at': 0.0}
+
+_status_cache = {'keys': None, 'version': None, 'checked_at': 0.0}
+
+_tracking_cache = OrderedDict()
+_tracking_state = {'version': None, 'checked_at': 0.0}
+_tracking_lock = threading.Lock()
+
+def is_tariff_stale() -> bool:
+    """Пора ли перепроверить версию тарифа в БД"""
+    return _tariff_cache['tariff'] is None or time.monotonic() - _tariff_cache['checked_at'] >= TARIFF_CACHE_TTL_SECONDS
+
+def get_tariff(cursor) -> dict:
+    """Возвращает таблицу тарифов из кеша, перечитывая настройки после смены версии"""
+    now = time.monotonic()
+    if not is_tariff_stale():
+        return _tariff_cache['tariff']
+    
+    cursor.execute(
+        "SELECT COALESCE(SUM(version), 0) AS version FROM cache_versions WHERE resource IN ('settings', 'delivery_points')"
+    )
+    version = cursor.fetchone()['version']
+    
+    if _tariff_cache['tariff'] is None or version != _tariff_cache['version']:
+        cursor.execute("SELECT key, value FROM settings WHERE key LIKE 'tariff%'")
+        settings = {row['key']: row['value'] for row in cursor.fetchall()}
+        cursor.execute("SELECT id, city FROM delivery_points_abkhazia")
+        point_cities = {row['id']: row['city'] for row in cursor.fetchall()}
+        try:
+            _tariff_cache['tariff'] = compile_tariff(settings, point_cities)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            _tariff_cache['tariff'] = DEFAULT_TARIFF
+        _tariff_cache['version'] = version
+        quote_parcel.cache_clear()
+    
+    _tariff_cache['checked_at'] = now
+    return _tariff_cache['tariff']
+
+def calculate_billed_weight(weight: float, length: float = None, width: float = None, height: float = None,
+                            tariff: dict = None) -> float:
+    """Возвращает оплачиваемый вес: больший из фактического и объемного"""
+    tariff = tariff or DEFAULT_TARIFF
     if length and width and height:
-        volumetric_weight = calculate_volumetric_weight(length, width, height)
-        actual_weight = max(weight, volumetric_weight)
+        return max(weight, calculate_volumetric_weight(length, width, height, tariff['volume_factor']))
+    return weight
+
+def calculate_price(weight: float, length: float = None, width: float = None, height: float = None,
+                    tariff: dict = None, delivery_type: str = None, delivery_point_id: int = None) -> float:
+    """Рассчитывает стоимость доставки с учетом габаритов"""
+    tariff = tariff or DEFAULT_TARIFF
+    actual_weight = calculate_billed_weight(weight, length, width, height, tariff)
+    
+    band = max(bisect_right(tariff['band_starts'], actual_weight) - 1, 0)
+    price = actual_weight * tariff['band_rates'][band]
+    
+    if delivery_point_id is not None:
+        price *= tariff['point_multipliers'].get(delivery_point_id, 1.0)
+    if delivery_type:
+        price += tariff['delivery_type_surcharges'].get(delivery_type, 0.0)
+    
+    return price
+
+@lru_cache(maxsize=QUOTE_CACHE_SIZE)
+def quote_parcel(weight: float, length: float, width: float, height: float,
+                 delivery_type: str, delivery_point_id: int) -> dict:
+    """Считает стоимость посылки по тарифу из памяти экземпляра; тариф обновляет обработчик не чаще раза в TARIFF_CACHE_TTL_SECONDS"""
+    tariff = _tariff_cache['tariff'] or DEFAULT_TARIFF
+    return {
+        'price': round(calculate_price(weight, length, width, height, tariff, delivery_type, delivery_point_id), 2),
+        'billed_weight': round(calculate_billed_weight(weight, length, width, height, tariff), 3),
+    }
+
+def parse_quote_parcel(parcel: dict) -> tuple:
+    """Приводит параметры посылки к ключу кеша расчета по тем же правилам, что и parse_order_payload"""
+    try:
+        weight = float(parcel.get('weight') or 0)
+        dimensions = tuple(
+            float(parcel[key]) if parcel.get(key) else None for key in ('length', 'width', 'height')
+        )
+    except (TypeError, ValueError):
+        raise ValueError('Некорректный вес или габариты')
+    
+    for value in (weight, *dimensions):
+        if value is not None and not (math.isfinite(value) and 0 <= value < ORDER_DECIMAL_MAX):
+            raise ValueError('Некорректный вес или габариты')
+    if weight <= 0:
+        raise ValueError('Укажите вес посылки')
+    
+    delivery_type = parcel.get('delivery_type', 'home')
+    if not isinstance(delivery_type, str) or delivery_type not in ORDER_DELIVERY_TYPES:
+        raise ValueError('Тип доставки: home или pickup')
+    delivery_point_id = _parse_optional_id(parcel.get('delivery_point_id'), 'Некорректный пункт выдачи')
+    return (weight, *dimensions, delivery_type, delivery_point_id)
+
+def bump_cache_version(cursor, resource: str):
+    """Увеличивает версию данных, чтобы теплые экземпляры функций сбросили кеш"""
+    cursor.execute(
+        "UPDATE cache_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE resource = %s",
+        (resource,)
+    )
+
+def sync_tracking_cache(cursor):
+    """Сбрасывает кеш отслеживания, если статусы заказов менялись в других экземплярах"""
+    cursor.execute(
+        "SELECT COALESCE(SUM(version), 0) AS version FROM cache_versions WHERE resource IN ('order_tracking', 'statuses')"
+    )
+    version = cursor.fetchone()['version']
+    with _tracking_lock:
+        if version != _tracking_state['version']:
+            _tracking_cache.clear()
+            _tracking_state['version'] = version
+        _tracking_state['checked_at'] = time.monotonic()
+
+def get_cached_tracking(order_number: str):
+    """Возвращает закешированный ответ отслеживания, если версия проверялась недавно"""
+    with _tracking_lock:
+        if time.monotonic() - _tracking_state['checked_at'] >= TRACKING_VERSION_CHECK_SECONDS:
+            return None
+        body = _tracking_cache.get(order_number)
+        if body is not None:
+            _tracking_cache.move_to_end(order_number)
+        return body
+
+def cache_tracking(order_number: str, body: str):
+    """Кладет ответ отслеживания в ограниченный LRU-кеш"""
+    with _tracking_lock:
+        _tracking_cache[order_number] = body
+        _tracking_cache.move_to_end(order_number)
+        while len(_tracking_cache) > TRACKING_CACHE_SIZE:
+            _tracking_cache.popitem(last=False)
+
+def invalidate_tracking(order_number: str):
+    """Удаляет заказ из кеша отслеживания этого экземпляра"""
+    with _tracking_lock:
+        _tracking_cache.pop(order_number, None)
+
+ORDER_INSERT_COLUMNS = (
+    'user_id', 'recipient_name', 'recipient_phone', 'delivery_address', 'weight', 'length', 'width',
+    'height', 'price', 'delivery_type', 'comment', 'status', 'pickup_point_id', 'delivery_point_id'
+)
+
+def dwell_bucket(seconds: float) -> int:
+    """Номер логарифмической корзины гистограммы для времени в статусе"""
+    return int(math.log2(max(seconds, 0) + 1) * DWELL_BUCKETS_PER_DOUBLING)
+
+def dwell_bucket_upper_seconds(bucket: int) -> float:
+    """Верхняя граница корзины гистограммы в секундах"""
+    return 2 ** ((bucket + 1) / DWELL_BUCKETS_PER_DOUBLING) - 1
+
+def record_status_events(cursor, events: list):
+    """Пишет события смены статуса и обновляет гистограмму времени в статусах
+    
+    events — кортежи (order_id, from_status, to_status, dwell_seconds); для новых заказов
+    from_status и dwell_seconds равны None.
+    """
+    if not events:
+        return
+    execute_values(
+        cursor,
+        "INSERT INTO order_status_events (order_id, from_status, to_status, dwell_seconds) VALUES %s",
+        events,
+        page_size=len(events)
+    )
+    
+    buckets = Counter(
+        (from_status, dwell_bucket(dwell_seconds))
+        for _, from_status, _, dwell_seconds in events
+        if from_status is not None and dwell_seconds is not None
+    )
+    if buckets:
+        # Строки в порядке ключа: параллельные транзакции блокируют их в одной очередности и не взаимоблокируются
+        execute_values(
+            cursor,
+            """INSERT INTO order_stage_dwell_stats (stage, bucket, count) VALUES %s
+               ON CONFLICT (stage, bucket) DO UPDATE SET count = order_stage_dwell_stats.count + EXCLUDED.count""",
+            [(stage, bucket, count) for (stage, bucket), count in sorted(buckets.items())],
+            page_size=len(buckets)
+        )
+
+def summarize_dwell_stats(rows: list) -> dict:
+    """Считает p50/p95 времени в каждом статусе по гистограмме"""
+    stages = {}
+    for row in sorted(rows, key=lambda row: (row['stage'], row['bucket'])):
+        stages.setdefault(row['stage'], []).append((row['bucket'], row['count']))
+    
+    summary = {}
+    for stage, buckets in stages.items():
+        total = sum(count for _, count in buckets)
+        percentiles = {}
+        for name, share in (('p50_seconds', 0.5), ('p95_seconds', 0.95)):
+            seen = 0
+            for bucket, count in buckets:
+                seen += count
+                if seen >= total * share:
+                    percentiles[name] = round(dwell_bucket_upper_seconds(bucket))
+                    break
+        summary[stage] = {'count': total, **percentiles}
+    return summary
+
+def get_active_statuses(cursor, force: bool = False) -> frozenset:
+    """Возвращает множество активных ключей статусов из кеша, перечитывая справочник после смены версии"""
+    now = time.monotonic()
+    if not force and _status_cache['keys'] is not None and now - _status_cache['checked_at'] < STATUS_CACHE_TTL_SECONDS:
+        return _status_cache['keys']
+    
+    cursor.execute("SELECT version FROM cache_versions WHERE resource = 'statuses'")
+    row = cursor.fetchone()
+    version = row['version'] if row else None
+    
+    if _status_cache['keys'] is None or version != _status_cache['version']:
+        cursor.execute("SELECT status_key FROM order_statuses WHERE is_active = TRUE")
+        _status_cache['keys'] = frozenset(row['status_key'] for row in cursor.fetchall())
+        _status_cache['version'] = version
+    
+    _status_cache['checked_at'] = now
+    return _status_cache['keys']
+
+def is_valid_status(cursor, status: str) -> bool:
+    """Проверяет статус по кешу; неизвестный статус перепроверяется по свежей версии справочника"""
+    if status in get_active_statuses(cursor):
+        return True
+    return status in get_active_statuses(cursor, force=True)
+
+def transition_orders(cursor, status: str, condition: str, values: list) -> tuple:
+    """Переводит выбранные заказы в статус одним UPDATE и пишет события
+    
+    Заказы, уже стоящие в этом статусе, не трогает. Возвращает пары (заказ, прежний статус)
+    и признак truncated: под условие попало больше ORDERS_BATCH_MAX_SIZE заказов.
+    """
+    cursor.execute(
+        f"""UPDATE orders o SET status = %s, updated_at = CURRENT_TIMESTAMP
+            FROM (SELECT id, status, COALESCE(updated_at, created_at) AS entered_at
+                  FROM orders WHERE ({condition}) AND status <> %s ORDER BY id LIMIT %s FOR UPDATE) previous
+            WHERE o.id = previous.id
+            RETURNING o.*, previous.status AS previous_status,
+                      EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - previous.entered_at)) AS dwell_seconds""",
+        (status, *values, status, ORDERS_BATCH_MAX_SIZE)
+    )
+    
+    transitions = []
+    events = []
+    for row in cursor.fetchall():
+        order = dict(row)
+        previous_status = order.pop('previous_status')
+        dwell_seconds = float(order.pop('dwell_seconds'))
+        if previous_status != order['status']:
+            events.append((order['id'], previous_status, order['status'], int(dwell_seconds)))
+        transitions.append((order, previous_status))
+    
+    record_status_events(cursor, events)
+    if transitions:
+        bump_cache_version(cursor, 'order_tracking')
+    
+    truncated = False
+    if len(transitions) >= ORDERS_BATCH_MAX_SIZE:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM orders WHERE ({condition}) AND status <> %s) AS truncated",
+            (*values, status)
+        )
+        truncated = cursor.fetchone()['truncated']
+    return transitions, truncated
+
+def summarize_daily_rollups(rows: list) -> dict:
+    """Сводит строки дневных агрегатов в итоги, разбивку по дням и по статусам"""
+    totals = {'orders_count': 0, 'revenue': 0, 'weight': 0}
+    by_day = {}
+    by_status = {}
+    
+    for row in rows:
+        day = str(row['day'])
+        for group in (totals, by_day.setdefault(day, {'day': day, 'orders_count': 0, 'revenue': 0, 'weight': 0}),
+                      by_status.setdefault(row['status'], {'status': row['status'], 'orders_count': 0, 'revenue': 0, 'weight': 0})):
+            group['orders_count'] += row['orders_count']
+            group['revenue'] += row['revenue']
+            group['weight'] += row['weight']
+    
+    return {
+        'totals': totals,
+        'by_day': list(by_day.values()),
+        'by_status': list(by_status.values()),
+        'rows': [dict(row) for row in rows],
+    }
+
+def _parse_optional_id(value, message: str):
+    """Приводит необязательный идентификатор из тела запроса к int"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise ValueError(message)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(message)
+
+def parse_order_payload(body: dict, tariff: dict = None) -> dict:
+    """Проверяет данные нового заказа и считает его стоимость"""
+    try:
+        weight = float(body.get('weight', 0))
+        length = float(body.get('length', 0)) if body.get('length') else None
+        width = float(body.get('width', 0)) if body.get('width') else None
+        height = float(body.get('height', 0)) if body.get('height') else None
+    except (TypeError, ValueError):
+        raise ValueError('Некорректный вес или габариты')
+    
+    for value in (weight, length, width, height):
+        if value is not None and not (math.isfinite(value) and 0 <= value < ORDER_DECIMAL_MAX):
+            raise ValueError('Некорректный вес или габариты')
+    
+    order = {
+        'user_id': _parse_optional_id(body.get('user_id'), 'Некорректный пользователь'),
+        'recipient_name': str(body.get('recipient_name') or '').strip(),
+        'recipient_phone': str(body.get('recipient_phone') or '').strip(),
+        'delivery_address': str(body.get('delivery_address') or '').strip(),
+        'weight': weight,
+        'length': length,
+        'width': width,
+        'height': height,
+        'delivery_type': body.get('delivery_type', 'home'),
+        'comment': str(body.get('comment') or '').strip(),
+        'status': 'processing',
+        'pickup_point_id': _parse_optional_id(body.get('pickup_point_id'), 'Некорректный пункт забора'),
+        'delivery_point_id': _parse_optional_id(body.get('delivery_point_id'), 'Некорректный пункт выдачи'),
+    }
+    
+    if not order['recipient_name'] or not order['recipient_phone'] or weight <= 0:
+        raise ValueError('Заполните все обязательные поля')
+    
+    if any(len(order[field]) > max_length for field, max_length in ORDER_FIELD_MAX_LENGTHS.items()):
+        raise ValueError('Слишком длинное имя или телефон получателя')
+    
+    if order['delivery_type'] not in ORDER_DELIVERY_TYPES:
+        raise ValueError('Тип доставки: home или pickup')
+    
+    if order['delivery_type'] == 'pickup' and not order['delivery_point_id']:
+        raise ValueError('Выберите пункт выдачи')
+    
+    order['price'] = calculate_price(
+        weight, length, width, height, tariff,
+        order['delivery_type'], order['delivery_point_id']
+    )
+    if not (math.isfinite(order['price']) and order['price'] < ORDER_DECIMAL_MAX):
+        raise ValueError('Некорректный вес или габариты')
+    return order
+
+def find_missing_references(cursor, orders: list) -> list:
+    """Одним запросом находит у заказов ссылки на несуществующих пользователей и пункты; возвращает ошибку или None для каждого"""
+    references = {
+        'users': ('user_id', 'Пользователь не найден'),
+        'pickup_points': ('pickup_point_id', 'Пункт забора не найден'),
+        'delivery_points_abkhazia': ('delivery_point_id', 'Пункт выдачи не найден'),
+    }
+    requested = {
+        table: sorted({order[column] for order in orders if order[column] is not None})
+        for table, (column, _) in references.items()
+    }
+    existing = {table: set() for table in references}
+    if any(requested.values()):
+        cursor.execute(
+            " UNION ALL ".join(f"SELECT '{table}' AS source, id FROM {table} WHERE id = ANY(%s)" for table in references),
+            [requested[table] for table in references]
+        )
+        for row in cursor.fetchall():
+            existing[row['source']].add(row['id'])
     
-    if actual_weight < 10:
-        return actual_weight * 120
-    return actual_weight * 100
+    errors = []
+    for order in orders:
+        error = None
+        for table, (column, message) in references.items():
+            if order[column] is not None and order[column] not in existing[table]:
+                error = message
+                break
+        errors.append(error)
+    return errors
 
-def generate_order_number(order_id: int) -> str:
-    """Генерирует номер заказа"""
-    return f"BB-{str(order_id).zfill(3)}"
+def insert_orders_batch(cursor, orders: list) -> list:
+    """Вставляет пачку заказов одним INSERT и возвращает созданные строки в том же порядке"""
+    return execute_values(
+        cursor,
+        f"INSERT INTO orders ({', '.join(ORDER_INSERT_COLUMNS)}) VALUES %s RETURNING *",
+        [tuple(order[column] for column in ORDER_INSERT_COLUMNS) for order in orders],
+        page_size=len(orders),
+        fetch=True
+    )
 
+def search_orders(cursor, query: str, limit: int) -> list:
+    """Ищет заказы по части имени, адреса, номера или телефона через триграммные индексы и ранжирует по сходству"""
+    pattern = '%' + re.sub(r'([%_\\])', r'\\\1', query) + '%'
+    digits = re.sub(r'\D', '', query)
+    
+    phone_condition = ''
+    if len(digits) >= ORDERS_SEARCH_MIN_LENGTH:
+        phone_condition = "OR regexp_replace(recipient_phone, '\\D', '', 'g') LIKE %(digits_pattern)s"
+    
+    cursor.execute(
+        f"""SELECT id, order_number, recipient_name, recipient_phone, delivery_address, status, created_at,
+                   GREATEST(
+                       word_similarity(%(query)s, recipient_name),
+                       word_similarity(%(query)s, delivery_address),
+                       word_similarity(%(query)s, order_number),
+                       word_similarity(%(digits)s, regexp_replace(recipient_phone, '\\D', '', 'g'))
+                   ) AS rank
+            FROM orders
+            WHERE recipient_name ILIKE %(pattern)s
+               OR delivery_address ILIKE %(pattern)s
+               OR order_number ILIKE %(pattern)s
+               {phone_condition}
+            ORDER BY rank DESC, created_at DESC
+            LIMIT %(limit)s""",
+        {
+            'query': query,
+            'pattern': pattern,
+            'digits': digits,
+            'digits_pattern': f'%{digits}%',
+            'limit': limit,
+        }
+    )
+    return cursor.fetchall()
+
+def encode_orders_cursor(created_at: datetime, order_id: int) -> str:
+    """Кодирует позицию последнего заказа страницы в токен курсора"""
+    raw = f"{created_at.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_orders_cursor(token: str) -> tuple:
+    """Разбирает токен курсора в пару (created_at, id)"""
+    raw = base64.urlsafe_b64decode(token.encode()).decode()
+    created_at, order_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(created_at), int(order_id)
+
+def build_orders_filters(params: dict) -> tuple:
+    """Собирает условия WHERE для фильтров списка заказов"""
+    conditions = []
+    values = []
+    
+    if params.get('status'):
+        conditions.append("status = %s")
+        values.append(params['status'])
+    if params.get('delivery_type'):
+        conditions.append("delivery_type = %s")
+        values.append(params['delivery_type'])
+    if params.get('pickup_point_id'):
+        conditions.append("pickup_point_id = %s")
+        values.append(int(params['pickup_point_id']))
+    if params.get('delivery_point_id'):
+        conditions.append("delivery_point_id = %s")
+        values.append(int(params['delivery_point_id']))
+    if params.get('date_from'):
+        conditions.append("created_at >= %s")
+        values.append(datetime.fromisoformat(params['date_from']))
+    if params.get('date_to'):
+        conditions.append("created_at < %s")
+        values.append(datetime.fromisoformat(params['date_to']))
+    if params.get('cursor'):
+        cursor_created_at, cursor_id = decode_orders_cursor(params['cursor'])
+        conditions.append("(created_at, id) < (%s, %s)")
+        values.extend([cursor_created_at, cursor_id])
+    
+    return conditions, values
+
+def export_orders(conn, params: dict, export_format: str) -> tuple:
+    """Выгружает не больше limit заказов серверным курсором в NDJSON или CSV и возвращает курсор следующей порции"""
+    limit = min(int(params.get('limit', ORDERS_EXPORT_CHUNK_DEFAULT)), ORDERS_EXPORT_CHUNK_MAX)
+    if limit <= 0:
+        limit = ORDERS_EXPORT_CHUNK_DEFAULT
+    conditions, values = build_orders_filters({k: v for k, v in params.items() if k != 'cursor'})
+    if params.get('cursor'):
+        cursor_created_at, cursor_id = decode_orders_cursor(params['cursor'])
+        conditions.append("(created_at, id) > (%s, %s)")
+        values.extend([cursor_created_at, cursor_id])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    
+    output = io.StringIO()
+    export_cursor = conn.cursor(name='orders_export')
+    export_cursor.itersize = ORDERS_EXPORT_ITERSIZE
+    next_cursor = None
+    try:
+        export_cursor.execute(f"SELECT * FROM orders {where} ORDER BY created_at, id LIMIT %s", (*values, limit + 1))
+        columns = None
+        writer = csv.writer(output) if export_format == 'csv' else None
+        last = None
+        
+        for count, row in enumerate(export_cursor):
+            if columns is None:
+                columns = [column[0] for column in export_cursor.description]
+                created_at_index, id_index = columns.index('created_at'), columns.index('id')
+                if writer and not params.get('cursor'):
+                    writer.writerow(columns)
+            if count == limit:
+                next_cursor = encode_orders_cursor(last[created_at_index], last[id_index])
+                break
+            last = row
+            if writer:
+                writer.writerow(row)
+            else:
+                output.write(dumps_json(dict(zip(columns, row))))
+                output.write('\n')
+    finally:
+        export_cursor.close()
+    
+    return output.getvalue(), next_cursor
+
+def _b64url_encode(data: bytes) -> str:
+    """Кодирует байты в base64url без выравнивания"""
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64url_decode(data: str) -> bytes:
+    """Декодирует base64url без выравнивания"""
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def _sign_session_payload(payload: str) -> str:
+    """Подписывает полезную нагрузку токена сессии секретом SESSION_SECRET"""
+    secret = os.environ['SESSION_SECRET'].encode()
+    return _b64url_encode(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+
+def verify_session_token(token: str):
+    """Проверяет подпись и срок действия токена сессии без обращения к БД"""
+    if not os.environ.get('SESSION_SECRET'):
+        return None
+    try:
+        payload, signature = token.split('.')
+        if not hmac.compare_digest(signature, _sign_session_payload(payload)):
+            return None
+        session = json.loads(_b64url_decode(payload))
+    except (KeyError, ValueError):
+        return None
+    if session.get('exp', 0) < time.time():
+        return None
+    return session
+
+def get_session(event: dict):
+    """Достает сессию из заголовка X-Auth-Token или Authorization: Bearer"""
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    token = headers.get('x-auth-token') or ''
+    if not token and headers.get('authorization', '').startswith('Bearer '):
+        token = headers['authorization'][len('Bearer '):]
+    return verify_session_token(token.strip()) if token else None
+
+def admin_required(event: dict):
+    """Возвращает ответ 401/403, если запрос пришел не от администратора, иначе None"""
+    session = get_session(event)
+    if session and session.get('adm'):
+        return None
+    return json_response(403 if session else 401, {'error': 'Доступно только администратору' if session else 'Требуется авторизация'})
+
+def owner_required(event: dict, user_id: str):
+    """Возвращает ответ 401/403, если запрос пришел не от владельца данных и не от администратора, иначе None"""
+    session = get_session(event)
+    if session and (session.get('adm') or str(session.get('uid')) == str(user_id).strip()):
+        return None
+    return json_response(403 if session else 401, {'error': 'Нет доступа к заказам этого пользователя' if session else 'Требуется авторизация'})
+
+@compressed_responses
 def handler(event: dict, context):
     """API для управления заказами"""
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return build_response(200, '', headers={
+            'Access-Control-Allow-Methods': 'GET, POST, PUT, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, Authorization'
+        })
     
     try:
+        params = event.get('queryStringParameters', {}) or {}
+        
+        if params.get('action') == 'quote' and method == 'POST':
+            body = json.loads(event.get('body', '{}'))
+            is_batch = isinstance(body.get('parcels'), list)
+            parcels = body['parcels'] if is_batch else [body]
+            
+            if len(parcels) > ORDERS_BATCH_MAX_SIZE:
+                return json_response(400, {'error': f'Не больше {ORDERS_BATCH_MAX_SIZE} посылок за запрос'})
+            
+            if is_tariff_stale():
+                conn = get_db_connection()
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                get_tariff(cursor)
+            
+            quotes = []
+            for parcel in parcels:
+                try:
+                    quote = quote_parcel(*parse_quote_parcel(parcel if isinstance(parcel, dict) else {}))
+                    if not (math.isfinite(quote['price']) and quote['price'] < ORDER_DECIMAL_MAX):
+                        raise ValueError('Некорректный вес или габариты')
+                    quotes.append(quote)
+                except ValueError as e:
+                    quotes.append({'error': str(e)})
+            
+            if not is_batch and 'error' in quotes[0]:
+                return json_response(400, quotes[0])
+            
+            return json_response(200, {'quotes': quotes} if is_batch else quotes[0])
+        
+        if params.get('track') and method == 'GET':
+            order_number = params['track'].strip()
+            body = get_cached_tracking(order_number)
+            
+            if body is None:
+                conn = get_db_connection()
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                sync_tracking_cache(cursor)
+                body = get_cached_tracking(order_number)
+            
+            if body is None:
+                cursor.execute(
+                    """SELECT o.order_number, o.status, COALESCE(s.status_label, o.status) AS status_label, o.updated_at
+                       FROM orders o
+                       LEFT JOIN order_statuses s ON s.status_key = o.status
+                       WHERE o.order_number = %s""",
+                    (order_number,)
+                )
+                tracking = cursor.fetchone()
+                if not tracking:
+                    return json_response(404, {'error': 'Заказ не найден'})
+                body = dumps_json(dict(tracking))
+                cache_tracking(order_number, body)
+            
+            return build_response(200, body)
+        
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
-            params = event.get('queryStringParameters', {}) or {}
             user_id = params.get('user_id')
             order_id = params.get('order_id')
             order_number = params.get('order_number')
+            export_format = params.get('export')
+            
+            if export_format:
+                denied = admin_required(event)
+                if denied:
+                    return denied
+                
+                if export_format not in ORDERS_EXPORT_FORMATS:
+                    return json_response(400, {'error': 'Формат выгрузки: ndjson или csv'})
+                try:
+                    export_body, next_cursor = export_orders(conn, params, export_format)
+                except ValueError:
+                    return json_response(400, {'error': 'Некорректные параметры фильтра или курсора'})
+                headers = {
+                    'Content-Type': ORDERS_EXPORT_FORMATS[export_format],
+                    'Content-Disposition': f'attachment; filename="orders.{export_format}"',
+                    'Access-Control-Expose-Headers': 'X-Next-Cursor'
+                }
+                if next_cursor:
+                    headers['X-Next-Cursor'] = next_cursor
+                return build_response(200, export_body, headers=headers)
             
             if order_number:
+                denied = admin_required(event)
+                if denied:
+                    return denied
+                
                 cursor.execute(
                     "SELECT * FROM orders WHERE order_number = %s",
                     (order_number,)
                 )
                 order = cursor.fetchone()
                 if order:
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps(dict(order), default=str),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(200, dict(order))
                 else:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Заказ не найден'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(404, {'error': 'Заказ не найден'})
+            
+            if params.get('search') is not None:
+                denied = admin_required(event)
+                if denied:
+                    return denied
+                
+                query = params['search'].strip()
+                try:
+                    limit = min(int(params.get('limit', ORDERS_SEARCH_DEFAULT_LIMIT)), ORDERS_SEARCH_MAX_LIMIT)
+                except ValueError:
+                    limit = ORDERS_SEARCH_DEFAULT_LIMIT
+                
+                if len(query) < ORDERS_SEARCH_MIN_LENGTH:
+                    return json_response(400, {'error': f'Введите не меньше {ORDERS_SEARCH_MIN_LENGTH} символов'})
+                
+                orders = search_orders(cursor, query, max(limit, 1))
+                return json_response(200, [dict(order) for order in orders])
+            
+            if params.get('timeline'):
+                if not get_session(event):
+                    return json_response(401, {'error': 'Требуется авторизация'})
+                try:
+                    timeline_order_id = int(params['timeline'])
+                except ValueError:
+                    return json_response(400, {'error': 'Некорректный номер заказа'})
+                
+                cursor.execute("SELECT user_id FROM orders WHERE id = %s", (timeline_order_id,))
+                order = cursor.fetchone()
+                if not order:
+                    return json_response(404, {'error': 'Заказ не найден'})
+                denied = owner_required(event, order['user_id'])
+                if denied:
+                    return denied
+                
+                cursor.execute(
+                    """SELECT from_status, to_status, dwell_seconds, created_at
+                       FROM order_status_events WHERE order_id = %s ORDER BY created_at, id""",
+                    (timeline_order_id,)
+                )
+                return json_response(200, [dict(event) for event in cursor.fetchall()])
+            
+            if params.get('stats') == 'daily':
+                denied = admin_required(event)
+                if denied:
+                    return denied
+                
+                try:
+                    date_from = datetime.fromisoformat(params['date_from']).date() if params.get('date_from') else datetime.now().date()
+                    date_to = datetime.fromisoformat(params['date_to']).date() if params.get('date_to') else None
+                except ValueError:
+                    return json_response(400, {'error': 'Некорректный период'})
+                
+                cursor.execute(
+                    """SELECT day, status, delivery_type, delivery_point_id, orders_count, revenue, weight
+                       FROM order_daily_rollups
+                       WHERE day >= %s AND (%s::date IS NULL OR day < %s::date) AND orders_count <> 0
+                       ORDER BY day, status, delivery_type, delivery_point_id""",
+                    (date_from, date_to, date_to)
+                )
+                return json_response(200, summarize_daily_rollups(cursor.fetchall()))
+            
+            if params.get('stats') == 'dwell':
+                denied = admin_required(event)
+                if denied:
+                    return denied
+                
+                cursor.execute("SELECT stage, bucket, count FROM order_stage_dwell_stats")
+                return json_response(200, summarize_dwell_stats(cursor.fetchall()))
             
             if order_id:
+                if not get_session(event):
+                    return json_response(401, {'error': 'Требуется авторизация'})
+                try:
+                    order_id = int(order_id)
+                except ValueError:
+                    return json_response(400, {'error': 'Некорректный номер заказа'})
+                
                 cursor.execute(
                     "SELECT * FROM orders WHERE id = %s",
                     (order_id,)
                 )
                 order = cursor.fetchone()
-                if order:
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps(dict(order), default=str),
-                        'isBase64Encoded': False
-                    }
-                else:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Заказ не найден'}),
-                        'isBase64Encoded': False
-                    }
-            
-            if user_id:
+                if not order:
+                    return json_response(404, {'error': 'Заказ не найден'})
+                denied = owner_required(event, order['user_id'])
+                if denied:
+                    return denied
+                return json_response(200, dict(order))
+            
+            if not user_id:
+                denied = admin_required(event)
+                if denied:
+                    return denied
+                
+                try:
+                    limit = min(int(params.get('limit', ORDERS_PAGE_DEFAULT_LIMIT)), ORDERS_PAGE_MAX_LIMIT)
+                    conditions, values = build_orders_filters(params)
+                except ValueError:
+                    return json_response(400, {'error': 'Некорректные параметры фильтра или курсора'})
+                if limit <= 0:
+                    limit = ORDERS_PAGE_DEFAULT_LIMIT
+                
+                where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
                 cursor.execute(
-                    "SELECT * FROM orders WHERE user_id = %s ORDER BY created_at DESC",
-                    (user_id,)
+                    f"SELECT * FROM orders {where} ORDER BY created_at DESC, id DESC LIMIT %s",
+                    (*values, limit + 1)
                 )
-            else:
-                cursor.execute("SELECT * FROM orders ORDER BY created_at DESC")
+                orders = cursor.fetchall()
+                
+                next_cursor = None
+                if len(orders) > limit:
+                    orders = orders[:limit]
+                    last = orders[-1]
+                    next_cursor = encode_orders_cursor(last['created_at'], last['id'])
+                
+                return json_response(200, {
+                    'orders': [dict(order) for order in orders],
+                    'next_cursor': next_cursor
+                })
+            
+            denied = owner_required(event, user_id)
+            if denied:
+                return denied
             
+            try:
+                limit = min(int(params.get('limit', ORDERS_PAGE_DEFAULT_LIMIT)), ORDERS_PAGE_MAX_LIMIT)
+                conditions = ["user_id = %s"]
+                values = [int(user_id)]
+                if params.get('cursor'):
+                    cursor_created_at, cursor_id = decode_orders_cursor(params['cursor'])
+                    conditions.append("(created_at, id) < (%s, %s)")
+                    values.extend([cursor_created_at, cursor_id])
+            except ValueError:
+                return json_response(400, {'error': 'Некорректные параметры курсора'})
+            if limit <= 0:
+                limit = ORDERS_PAGE_DEFAULT_LIMIT
+            
+            cursor.execute(
+                f"""SELECT {', '.join(USER_ORDERS_LIST_COLUMNS)} FROM orders
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY created_at DESC, id DESC LIMIT %s""",
+                (*values, limit + 1)
+            )
             orders = cursor.fetchall()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps([dict(order) for order in orders], default=str),
-                'isBase64Encoded': False
-            }
+            
+            next_cursor = None
+            if len(orders) > limit:
+                orders = orders[:limit]
+                last = orders[-1]
+                next_cursor = encode_orders_cursor(last['created_at'], last['id'])
+            
+            return json_response(200, {
+                'orders': [dict(order) for order in orders],
+                'next_cursor': next_cursor
+            })
         
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
             
-            user_id = body.get('user_id')
-            recipient_name = body.get('recipient_name', '').strip()
-            recipient_phone = body.get('recipient_phone', '').strip()
-            delivery_address = body.get('delivery_address', '').strip()
-            weight = float(body.get('weight', 0))
-            length = float(body.get('length', 0)) if body.get('length') else None
-            width = float(body.get('width', 0)) if body.get('width') else None
-            height = float(body.get('height', 0)) if body.get('height') else None
-            delivery_type = body.get('delivery_type', 'home')
-            comment = body.get('comment', '').strip()
-            pickup_point_id = body.get('pickup_point_id')
-            delivery_point_id = body.get('delivery_point_id')
-            
-            if not recipient_name or not recipient_phone or weight <= 0:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Заполните все обязательные поля'}),
-                    'isBase64Encoded': False
-                }
+            if isinstance(body.get('orders'), list):
+                items = body['orders']
+                if not items or len(items) > ORDERS_BATCH_MAX_SIZE:
+                    return json_response(400, {'error': f'В пачке должно быть от 1 до {ORDERS_BATCH_MAX_SIZE} заказов'})
+                
+                tariff = get_tariff(cursor)
+                results = []
+                parsed = []
+                for index, item in enumerate(items):
+                    try:
+                        parsed.append(parse_order_payload(item if isinstance(item, dict) else {}, tariff))
+                        results.append({'index': index, 'success': True})
+                    except ValueError as e:
+                        results.append({'index': index, 'success': False, 'error': str(e)})
+                
+                valid_orders = []
+                parsed_results = [result for result in results if result['success']]
+                for result, order, error in zip(parsed_results, parsed, find_missing_references(cursor, parsed)):
+                    if error:
+                        result.update(success=False, error=error)
+                    else:
+                        valid_orders.append(order)
+                
+                created = insert_orders_batch(cursor, valid_orders) if valid_orders else []
+                record_status_events(cursor, [(row['id'], None, row['status'], None) for row in created])
+                conn.commit()
+                
+                created_iter = iter(created)
+                for result in results:
+                    if result['success']:
+                        result['order'] = dict(next(created_iter))
+                
+                return json_response(201 if created else 400, {
+                    'created': len(created),
+                    'failed': len(results) - len(created),
+                    'results': results
+                })
             
-            if delivery_type == 'pickup' and not delivery_point_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Выберите пункт выдачи'}),
-                    'isBase64Encoded': False
-                }
+            try:
+                new_order = parse_order_payload(body, get_tariff(cursor))
+            except ValueError as e:
+                return json_response(400, {'error': str(e)})
             
-            price = calculate_price(weight, length, width, height)
-            
-            cursor.execute(
-                """INSERT INTO orders (order_number, user_id, recipient_name, recipient_phone, 
-                   delivery_address, weight, length, width, height, price, delivery_type, comment, status, pickup_point_id, delivery_point_id) 
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) 
-                   RETURNING *""",
-                ('TEMP', user_id, recipient_name, recipient_phone, delivery_address, 
-                 weight, length, width, height, price, delivery_type, comment, 'processing', pickup_point_id, delivery_point_id)
-            )
-            order = cursor.fetchone()
-            order_dict = dict(order)
-            
-            order_number = generate_order_number(order_dict['id'])
-            cursor.execute(
-                "UPDATE orders SET order_number = %s WHERE id = %s",
-                (order_number, order_dict['id'])
-            )
-            order_dict['order_number'] = order_number
+            reference_error = find_missing_references(cursor, [new_order])[0]
+            if reference_error:
+                return json_response(400, {'error': reference_error})
             
+            order = insert_orders_batch(cursor, [new_order])[0]
+            record_status_events(cursor, [(order['id'], None, order['status'], None)])
             conn.commit()
             
-            return {
-                'statusCode': 201,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(order_dict, default=str),
-                'isBase64Encoded': False
-            }
+            return json_response(201, dict(order))
         
         elif method == 'PUT':
+            denied = admin_required(event)
+            if denied:
+                return denied
+            
             body = json.loads(event.get('body', '{}'))
             order_id = body.get('order_id')
             status = body.get('status')
             
+            if any(key in body for key in ('order_ids', 'order_numbers', 'filter')):
+                if not status:
+                    return json_response(400, {'error': 'Статус обязателен'})
+                
+                if not is_valid_status(cursor, status):
+                    return json_response(400, {'error': 'Неизвестный статус'})
+                
+                requested = None
+                try:
+                    if body.get('order_ids'):
+                        requested = ('id', [int(item) for item in body['order_ids']])
+                        condition, values = "id = ANY(%s)", [requested[1]]
+                    elif body.get('order_numbers'):
+                        requested = ('order_number', [str(item) for item in body['order_numbers']])
+                        condition, values = "order_number = ANY(%s)", [requested[1]]
+                    else:
+                        filters = {k: v for k, v in (body.get('filter') or {}).items() if k != 'cursor'}
+                        conditions, values = build_orders_filters(filters)
+                        if not conditions:
+                            raise ValueError
+                        condition = ' AND '.join(conditions)
+                except (TypeError, ValueError):
+                    return json_response(400, {'error': 'Укажите список заказов или фильтр'})
+                
+                if requested and len(requested[1]) > ORDERS_BATCH_MAX_SIZE:
+                    return json_response(400, {'error': f'Не больше {ORDERS_BATCH_MAX_SIZE} заказов за запрос'})
+                
+                transitions, truncated = transition_orders(cursor, status, condition, values)
+                conn.commit()
+                
+                results = []
+                updated_keys = set()
+                for order, previous_status in transitions:
+                    invalidate_tracking(order['order_number'])
+                    if requested:
+                        updated_keys.add(order[requested[0]])
+                    results.append({
+                        'order_id': order['id'],
+                        'order_number': order['order_number'],
+                        'success': True,
+                        'previous_status': previous_status,
+                        'status': order['status']
+                    })
+                if requested:
+                    missing = [key for key in requested[1] if key not in updated_keys]
+                    unchanged = {}
+                    if missing:
+                        cursor.execute(
+                            f"SELECT id, order_number FROM orders WHERE {requested[0]} = ANY(%s)",
+                            (missing,)
+                        )
+                        unchanged = {row[requested[0]]: row for row in cursor.fetchall()}
+                    for key in missing:
+                        if key in unchanged:
+                            results.append({
+                                'order_id': unchanged[key]['id'],
+                                'order_number': unchanged[key]['order_number'],
+                                'success': True,
+                                'unchanged': True,
+                                'status': status
+                            })
+                        else:
+                            results.append({
+                                'order_id' if requested[0] == 'id' else 'order_number': key,
+                                'success': False,
+                                'error': 'Заказ не найден'
+                            })
+                
+                return json_response(200, {'updated': len(transitions), 'truncated': truncated, 'results': results})
+            
             if not order_id or not status:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'ID заказа и статус обязательны'}),
-                    'isBase64Encoded': False
-                }
+                return json_response(400, {'error': 'ID заказа и статус обязательны'})
             
-            cursor.execute(
-                "UPDATE orders SET status = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s RETURNING *",
-                (status, order_id)
-            )
-            order = cursor.fetchone()
+            if not is_valid_status(cursor, status):
+                return json_response(400, {'error': 'Неизвестный статус'})
+            
+            transitions, _ = transition_orders(cursor, status, "id = %s", [order_id])
             conn.commit()
             
+            if transitions:
+                order = transitions[0][0]
+                invalidate_tracking(order['order_number'])
+                return json_response(200, order)
+            
+            cursor.execute("SELECT * FROM orders WHERE id = %s", (order_id,))
+            order = cursor.fetchone()
             if order:
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(order), default=str),
-                    'isBase64Encoded': False
-                }
+                return json_response(200, dict(order))
             else:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Заказ не найден'}),
-                    'isBase64Encoded': False
-                }
+                return json_response(404, {'error': 'Заказ не найден'})
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
+        return json_response(405, {'error': 'Метод не поддерживается'})
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        return json_response(500, {'error': str(e)})
     finally:
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+            release_db_connection(conn)
\ No newline at end of file
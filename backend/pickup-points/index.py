@@ -1,17 +1,202 @@
+import gzip
+import hmac
 import json
 import os
+import select
+import threading
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
-import qrcode
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 import io
 import base64
+import hashlib
+from collections import OrderedDict
+from itertools import groupby
+from datetime import date, datetime
+from decimal import Decimal
+from functools import wraps
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_MAX_IDLE_SECONDS = float(os.environ.get('DB_POOL_MAX_IDLE_SECONDS', '300'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+RESPONSE_COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+RESPONSE_GZIP_LEVEL = 6
+RESPONSE_BROTLI_QUALITY = 5
+
+QR_CACHE_SIZE = int(os.environ.get('QR_CACHE_SIZE', '512'))
+QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR')
+QR_FORMATS = ('png', 'svg', 'matrix')
+
+LABEL_SHEET_FORMATS = {'pdf': 'application/pdf', 'png': 'image/png'}
+LABEL_SHEET_MAX_PAGES = {'pdf': 8, 'png': 1}
+LABEL_PAGE_SIZE = (1240, 1754)
+LABEL_GRID = (2, 4)
+LABEL_FONT_PATH = os.environ.get('LABEL_FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+LABEL_WORKERS = int(os.environ.get('LABEL_WORKERS', str(os.cpu_count() or 1)))
+
+REFERENCE_CACHE_MAX_AGE_SECONDS = int(os.environ.get('REFERENCE_CACHE_MAX_AGE_SECONDS', '0'))
+
+_db_pool = []
+_db_pool_lock = threading.Lock()
+
+_qr_cache = OrderedDict()
+_qr_cache_lock = threading.Lock()
+
+def _close_quietly(conn):
+    """Закрывает соединение, игнорируя ошибки"""
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _is_connection_alive(conn) -> bool:
+    """Проверяет, что соединение из пула еще живо"""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _has_pending_input(conn) -> bool:
+    """Без запроса к серверу проверяет, не закрыл ли сервер соединение: живому соединению в простое читать нечего"""
+    try:
+        readable, _, _ = select.select([conn], [], [], 0)
+    except (OSError, ValueError, psycopg2.Error):
+        return True
+    return bool(readable)
 
 def get_db_connection():
-    """Создает подключение к базе данных"""
+    """Берет теплое соединение из пула или создает новое"""
+    while True:
+        with _db_pool_lock:
+            if not _db_pool:
+                break
+            conn, released_at = _db_pool.pop()
+        idle_seconds = time.monotonic() - released_at
+        if conn.closed or idle_seconds > DB_POOL_MAX_IDLE_SECONDS or _has_pending_input(conn):
+            _close_quietly(conn)
+            continue
+        if idle_seconds > DB_POOL_HEALTHCHECK_SECONDS and not _is_connection_alive(conn):
+            _close_quietly(conn)
+            continue
+        return conn
     return psycopg2.connect(os.environ['DATABASE_URL'])
 
-def generate_qr_code(order_number: str) -> str:
-    """Генерирует QR-код для заказа"""
+def release_db_connection(conn):
+    """Возвращает соединение в пул между вызовами, сломанные и лишние закрывает"""
+    if conn.closed:
+        return
+    try:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        _close_quietly(conn)
+        return
+    
+    now = time.monotonic()
+    evicted = []
+    with _db_pool_lock:
+        alive = []
+        for pooled, released_at in _db_pool:
+            if now - released_at > DB_POOL_MAX_IDLE_SECONDS:
+                evicted.append(pooled)
+            else:
+                alive.append((pooled, released_at))
+        _db_pool[:] = alive
+        if len(_db_pool) < DB_POOL_MAX_SIZE:
+            _db_pool.append((conn, now))
+        else:
+            evicted.append(conn)
+    for stale in evicted:
+        _close_quietly(stale)
+
+def encode_json_value(value):
+    """Приводит типы из строк БД к JSON: Decimal в число, дату и время в ISO 8601"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def dumps_json(data) -> str:
+    """Сериализует данные ответа через orjson, если он установлен, иначе стандартным json"""
+    if orjson is not None:
+        return orjson.dumps(data, default=encode_json_value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, default=encode_json_value, ensure_ascii=False, separators=(',', ':'))
+
+def build_response(status_code: int, body: str, headers: dict = None, is_base64: bool = False) -> dict:
+    """Ответ функции с CORS и JSON по умолчанию; headers дополняют или заменяют заголовки"""
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', **(headers or {})},
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
+
+def json_response(status_code: int, data, headers: dict = None) -> dict:
+    """JSON-ответ функции"""
+    return build_response(status_code, dumps_json(data), headers)
+
+def accepted_encodings(event: dict) -> set:
+    """Кодировки сжатия из Accept-Encoding, кроме отключенных через q=0"""
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    encodings = set()
+    for part in (headers.get('accept-encoding') or '').split(','):
+        name, _, params = part.partition(';')
+        if params.replace(' ', '').lower() in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+def compress_response(event: dict, response: dict) -> dict:
+    """Сжимает текстовое тело ответа br или gzip, если оно больше порога и клиент это принимает"""
+    body = response.get('body')
+    headers = response.get('headers') or {}
+    if response.get('isBase64Encoded') or not body or 'Content-Encoding' in headers:
+        return response
+    data = body.encode()
+    if len(data) < RESPONSE_COMPRESS_MIN_BYTES:
+        return response
+    
+    encodings = accepted_encodings(event)
+    if brotli is not None and 'br' in encodings:
+        encoding, compressed = 'br', brotli.compress(data, quality=RESPONSE_BROTLI_QUALITY)
+    elif 'gzip' in encodings:
+        encoding, compressed = 'gzip', gzip.compress(data, compresslevel=RESPONSE_GZIP_LEVEL)
+    else:
+        return response
+    return {
+        **response,
+        'headers': {**headers, 'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'},
+        'body': base64.b64encode(compressed).decode(),
+        'isBase64Encoded': True
+    }
+
+def compressed_responses(handler_func):
+    """Сжимает крупные ответы обработчика по Accept-Encoding клиента"""
+    @wraps(handler_func)
+    def wrapper(event: dict, context):
+        return compress_response(event, handler_func(event, context))
+    return wrapper
+
+def make_qr(order_number: str):
+    """Собирает QR-код для заказа (qrcode импортируется лениво, чтобы не замедлять холодный старт)"""
+    import qrcode
+    
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -20,8 +205,11 @@ def generate_qr_code(order_number: str) -> str:
     )
     qr.add_data(f"BERIBOX-{order_number}")
     qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
+    return qr
+
+def render_qr_png(order_number: str) -> str:
+    """Рисует QR-код в PNG и возвращает data URI"""
+    img = make_qr(order_number).make_image(fill_color="black", back_color="white")
     
     buffer = io.BytesIO()
     img.save(buffer, format='PNG')
@@ -29,21 +217,284 @@ def generate_qr_code(order_number: str) -> str:
     
     return f'data:image/png;base64,{img_str}'
 
+def render_qr_svg(matrix: list, box_size: int = 10) -> str:
+    """Рисует матрицу QR-кода в SVG одним path, без Pillow
+    
+    Темные модули строки сливаются в отрезки, которые рисуются линией толщиной в модуль;
+    отрезки одной строки задаются относительным смещением от конца предыдущего.
+    """
+    size = len(matrix)
+    commands = []
+    for y, row in enumerate(matrix):
+        x = 0
+        pen = None
+        for dark, group in groupby(row):
+            length = len(list(group))
+            if dark:
+                commands.append(f'M{x} {y}.5h{length}' if pen is None else f'm{x - pen} 0h{length}')
+                pen = x + length
+            x += length
+    path = ''.join(commands)
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'width="{size * box_size}" height="{size * box_size}" shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill="#fff"/><path d="{path}" stroke="#000"/></svg>'
+    )
+    return f'data:image/svg+xml;base64,{base64.b64encode(svg.encode()).decode()}'
+
+def _render_qr(order_number: str, output_format: str):
+    """Рендерит QR-код в нужном формате без кеша"""
+    if output_format == 'png':
+        return render_qr_png(order_number)
+    matrix = make_qr(order_number).get_matrix()
+    if output_format == 'svg':
+        return render_qr_svg(matrix)
+    return [''.join('1' if dark else '0' for dark in row) for row in matrix]
+
+def _read_qr_disk_cache(key: str):
+    """Читает отрисованный QR-код с диска, если задан QR_CACHE_DIR"""
+    if not QR_CACHE_DIR:
+        return None
+    try:
+        with open(os.path.join(QR_CACHE_DIR, f'{key}.json'), encoding='utf-8') as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+def _write_qr_disk_cache(key: str, rendered):
+    """Сохраняет отрисованный QR-код на диск, если задан QR_CACHE_DIR"""
+    if not QR_CACHE_DIR:
+        return
+    try:
+        os.makedirs(QR_CACHE_DIR, exist_ok=True)
+        path = os.path.join(QR_CACHE_DIR, f'{key}.json')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as cache_file:
+            json.dump(rendered, cache_file)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+def generate_qr_code(order_number: str, output_format: str = 'png'):
+    """Генерирует QR-код для заказа: png/svg как data URI, matrix как строки из 0 и 1"""
+    key = hashlib.sha256(f'{output_format}:BERIBOX-{order_number}'.encode()).hexdigest()
+    
+    with _qr_cache_lock:
+        if key in _qr_cache:
+            _qr_cache.move_to_end(key)
+            return _qr_cache[key]
+    
+    rendered = _read_qr_disk_cache(key)
+    if rendered is None:
+        rendered = _render_qr(order_number, output_format)
+        _write_qr_disk_cache(key, rendered)
+    
+    with _qr_cache_lock:
+        _qr_cache[key] = rendered
+        while len(_qr_cache) > QR_CACHE_SIZE:
+            _qr_cache.popitem(last=False)
+    return rendered
+
+def _load_label_font(size: int):
+    """Загружает шрифт с кириллицей для этикеток, иначе встроенный"""
+    from PIL import ImageFont
+    
+    try:
+        return ImageFont.truetype(LABEL_FONT_PATH, size)
+    except OSError:
+        return ImageFont.load_default()
+
+def render_label_page(labels: list) -> bytes:
+    """Рисует страницу этикеток (QR-код, номер, получатель, пункт назначения) в PNG"""
+    from PIL import Image, ImageDraw
+    
+    page = Image.new('RGB', LABEL_PAGE_SIZE, 'white')
+    draw = ImageDraw.Draw(page)
+    title_font = _load_label_font(40)
+    text_font = _load_label_font(26)
+    columns, rows = LABEL_GRID
+    cell_width = LABEL_PAGE_SIZE[0] // columns
+    cell_height = LABEL_PAGE_SIZE[1] // rows
+    
+    for position, label in enumerate(labels):
+        left = (position % columns) * cell_width
+        top = (position // columns) * cell_height
+        draw.rectangle([left + 10, top + 10, left + cell_width - 10, top + cell_height - 10], outline='black', width=2)
+        
+        qr_image = make_qr(label['order_number']).make_image(fill_color="black", back_color="white")
+        qr_image = qr_image.get_image().convert('RGB').resize((cell_height - 160, cell_height - 160))
+        page.paste(qr_image, (left + (cell_width - qr_image.width) // 2, top + 20))
+        
+        text_top = top + cell_height - 135
+        draw.text((left + 30, text_top), label['order_number'], font=title_font, fill='black')
+        draw.text((left + 30, text_top + 50), label['recipient_name'] or '', font=text_font, fill='black')
+        draw.text((left + 30, text_top + 85), label['destination'] or '', font=text_font, fill='black')
+    
+    buffer = io.BytesIO()
+    page.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def render_label_sheet(labels: list, sheet_format: str) -> bytes:
+    """Собирает этикетки в многостраничный PDF или PNG из сложенных страниц, страницы рисуются параллельно"""
+    from PIL import Image
+    
+    per_page = LABEL_GRID[0] * LABEL_GRID[1]
+    chunks = [labels[i:i + per_page] for i in range(0, len(labels), per_page)]
+    
+    if len(chunks) > 1 and LABEL_WORKERS > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        
+        try:
+            with ProcessPoolExecutor(max_workers=min(LABEL_WORKERS, len(chunks))) as executor:
+                rendered = list(executor.map(render_label_page, chunks))
+        except (OSError, RuntimeError):
+            rendered = [render_label_page(chunk) for chunk in chunks]
+    else:
+        rendered = [render_label_page(chunk) for chunk in chunks]
+    
+    pages = [Image.open(io.BytesIO(page_png)) for page_png in rendered]
+    buffer = io.BytesIO()
+    if sheet_format == 'pdf':
+        pages[0].save(buffer, format='PDF', save_all=True, append_images=pages[1:], resolution=150)
+    else:
+        sheet = Image.new('RGB', (LABEL_PAGE_SIZE[0], LABEL_PAGE_SIZE[1] * len(pages)), 'white')
+        for index, page in enumerate(pages):
+            sheet.paste(page, (0, index * LABEL_PAGE_SIZE[1]))
+        sheet.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def fetch_label_orders(cursor, body: dict, limit: int, offset: int) -> list:
+    """Выбирает страницу заказов для этикеток по списку номеров или по статусу и датам"""
+    query = """SELECT o.order_number, o.recipient_name,
+                      COALESCE(d.city || ', ' || d.name, o.delivery_address) AS destination
+               FROM orders o
+               LEFT JOIN delivery_points_abkhazia d ON d.id = o.delivery_point_id"""
+    
+    order_numbers = body.get('order_numbers')
+    if order_numbers:
+        if not isinstance(order_numbers, list) or not all(isinstance(number, str) for number in order_numbers):
+            raise ValueError('order_numbers должен быть списком номеров заказов')
+        cursor.execute(
+            query + " WHERE o.order_number = ANY(%s) ORDER BY o.order_number LIMIT %s OFFSET %s",
+            (order_numbers, limit, offset)
+        )
+        return cursor.fetchall()
+    
+    conditions = []
+    values = []
+    if body.get('status'):
+        if not isinstance(body['status'], str):
+            raise ValueError('Некорректный статус')
+        conditions.append("o.status = %s")
+        values.append(body['status'])
+    try:
+        if body.get('date_from'):
+            conditions.append("o.created_at >= %s")
+            values.append(datetime.fromisoformat(body['date_from']))
+        if body.get('date_to'):
+            conditions.append("o.created_at < %s")
+            values.append(datetime.fromisoformat(body['date_to']))
+    except (TypeError, ValueError):
+        raise ValueError('Некорректный период')
+    if not conditions:
+        raise ValueError('Укажите номера заказов или фильтр по статусу и датам')
+    
+    cursor.execute(
+        query + f" WHERE {' AND '.join(conditions)} ORDER BY o.created_at, o.id LIMIT %s OFFSET %s",
+        (*values, limit, offset)
+    )
+    return cursor.fetchall()
+
+def bump_cache_version(cursor, resource: str):
+    """Увеличивает версию справочника, чтобы теплые экземпляры функций сбросили кеш"""
+    cursor.execute(
+        "UPDATE cache_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE resource = %s",
+        (resource,)
+    )
+
+def get_cache_version(cursor, resource: str) -> int:
+    """Возвращает текущую версию справочника"""
+    cursor.execute("SELECT version FROM cache_versions WHERE resource = %s", (resource,))
+    row = cursor.fetchone()
+    return row['version'] if row else 0
+
+def make_etag(resource: str, version: int) -> str:
+    """Собирает ETag справочника по его версии"""
+    return f'W/"{resource}-{version}"'
+
+def cache_headers(etag: str) -> dict:
+    """Заголовки кеширования для справочных данных"""
+    return {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={REFERENCE_CACHE_MAX_AGE_SECONDS}, must-revalidate',
+        'Access-Control-Expose-Headers': 'ETag',
+    }
+
+def is_not_modified(event: dict, etag: str) -> bool:
+    """Проверяет If-None-Match запроса против текущего ETag"""
+    headers = event.get('headers') or {}
+    if_none_match = next((value for key, value in headers.items() if key.lower() == 'if-none-match'), None)
+    if not if_none_match:
+        return False
+    return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+def not_modified_response(etag: str) -> dict:
+    """Ответ 304 без тела"""
+    return build_response(304, '', headers=cache_headers(etag))
+
+def _b64url_encode(data: bytes) -> str:
+    """Кодирует байты в base64url без выравнивания"""
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64url_decode(data: str) -> bytes:
+    """Декодирует base64url без выравнивания"""
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def _sign_session_payload(payload: str) -> str:
+    """Подписывает полезную нагрузку токена сессии секретом SESSION_SECRET"""
+    secret = os.environ['SESSION_SECRET'].encode()
+    return _b64url_encode(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+
+def verify_session_token(token: str):
+    """Проверяет подпись и срок действия токена сессии без обращения к БД"""
+    if not os.environ.get('SESSION_SECRET'):
+        return None
+    try:
+        payload, signature = token.split('.')
+        if not hmac.compare_digest(signature, _sign_session_payload(payload)):
+            return None
+        session = json.loads(_b64url_decode(payload))
+    except (KeyError, ValueError):
+        return None
+    if session.get('exp', 0) < time.time():
+        return None
+    return session
+
+def get_session(event: dict):
+    """Достает сессию из заголовка X-Auth-Token или Authorization: Bearer"""
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    token = headers.get('x-auth-token') or ''
+    if not token and headers.get('authorization', '').startswith('Bearer '):
+        token = headers['authorization'][len('Bearer '):]
+    return verify_session_token(token.strip()) if token else None
+
+def admin_required(event: dict):
+    """Возвращает ответ 401/403, если запрос пришел не от администратора, иначе None"""
+    session = get_session(event)
+    if session and session.get('adm'):
+        return None
+    return json_response(403 if session else 401, {'error': 'Доступно только администратору' if session else 'Требуется авторизация'})
+
+@compressed_responses
 def handler(event: dict, context):
     """API для управления пунктами выдачи и генерации QR-кодов"""
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return build_response(200, '', headers={
+            'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, Authorization'
+        })
     
     try:
         params = event.get('queryStringParameters', {}) or {}
@@ -53,42 +504,76 @@ def handler(event: dict, context):
             if method == 'POST':
                 body = json.loads(event.get('body', '{}'))
                 order_number = body.get('order_number', '')
+                output_format = body.get('format', 'png')
                 
                 if not order_number:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Номер заказа обязателен'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'Номер заказа обязателен'})
                 
-                qr_code = generate_qr_code(order_number)
+                if output_format not in QR_FORMATS:
+                    return json_response(400, {'error': 'Формат QR-кода: png, svg или matrix'})
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'qr_code': qr_code,
-                        'order_number': order_number
-                    }),
-                    'isBase64Encoded': False
-                }
+                qr_code = generate_qr_code(order_number, output_format)
+                
+                return json_response(200, {
+                    'qr_matrix' if output_format == 'matrix' else 'qr_code': qr_code,
+                    'order_number': order_number
+                })
+        
+        if method != 'GET':
+            denied = admin_required(event)
+            if denied:
+                return denied
         
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
+        if action == 'labels' and method == 'POST':
+            body = json.loads(event.get('body', '{}'))
+            sheet_format = body.get('format', 'pdf')
+            
+            if sheet_format not in LABEL_SHEET_FORMATS:
+                return json_response(400, {'error': 'Формат листа этикеток: pdf или png'})
+            
+            try:
+                page = int(body.get('page', 1))
+            except (TypeError, ValueError):
+                page = 0
+            if page < 1:
+                return json_response(400, {'error': 'Номер страницы должен быть положительным числом'})
+            
+            per_request = LABEL_SHEET_MAX_PAGES[sheet_format] * LABEL_GRID[0] * LABEL_GRID[1]
+            try:
+                labels = fetch_label_orders(cursor, body, per_request + 1, (page - 1) * per_request)
+            except ValueError as e:
+                return json_response(400, {'error': str(e)})
+            
+            if not labels:
+                return json_response(404, {'error': 'Заказы для этикеток не найдены'})
+            
+            headers = {
+                'Content-Type': LABEL_SHEET_FORMATS[sheet_format],
+                'Content-Disposition': f'inline; filename="labels-{page}.{sheet_format}"',
+                'Access-Control-Expose-Headers': 'X-Next-Page'
+            }
+            if len(labels) > per_request:
+                labels = labels[:per_request]
+                headers['X-Next-Page'] = str(page + 1)
+            
+            sheet = render_label_sheet([dict(label) for label in labels], sheet_format)
+            return build_response(200, base64.b64encode(sheet).decode(), headers=headers, is_base64=True)
+        
         if method == 'GET':
+            resource = 'delivery_points' if action == 'delivery' else 'pickup_points'
+            etag = make_etag(resource, get_cache_version(cursor, resource))
+            if is_not_modified(event, etag):
+                return not_modified_response(etag)
+            
             if action == 'delivery':
                 cursor.execute("SELECT * FROM delivery_points_abkhazia WHERE is_active = TRUE ORDER BY city, name")
             else:
                 cursor.execute("SELECT * FROM pickup_points WHERE is_active = TRUE ORDER BY name")
             points = cursor.fetchall()
-            return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps([dict(point) for point in points], default=str),
-                'isBase64Encoded': False
-            }
+            return json_response(200, [dict(point) for point in points], headers=cache_headers(etag))
         
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
@@ -97,21 +582,11 @@ def handler(event: dict, context):
             city = body.get('city', '').strip()
             
             if not name or not address:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Название и адрес обязательны'}),
-                    'isBase64Encoded': False
-                }
+                return json_response(400, {'error': 'Название и адрес обязательны'})
             
             if action == 'delivery':
                 if not city:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Город обязателен для пункта доставки'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'Город обязателен для пункта доставки'})
                 cursor.execute(
                     "INSERT INTO delivery_points_abkhazia (name, address, city) VALUES (%s, %s, %s) RETURNING *",
                     (name, address, city)
@@ -122,14 +597,11 @@ def handler(event: dict, context):
                     (name, address)
                 )
             point = cursor.fetchone()
+            if point:
+                bump_cache_version(cursor, 'delivery_points' if action == 'delivery' else 'pickup_points')
             conn.commit()
             
-            return {
-                'statusCode': 201,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(dict(point), default=str),
-                'isBase64Encoded': False
-            }
+            return json_response(201, dict(point))
         
         elif method == 'PUT':
             body = json.loads(event.get('body', '{}'))
@@ -139,21 +611,11 @@ def handler(event: dict, context):
             city = body.get('city', '').strip()
             
             if not point_id or not name or not address:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'ID, название и адрес обязательны'}),
-                    'isBase64Encoded': False
-                }
+                return json_response(400, {'error': 'ID, название и адрес обязательны'})
             
             if action == 'delivery':
                 if not city:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Город обязателен'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'Город обязателен'})
                 cursor.execute(
                     "UPDATE delivery_points_abkhazia SET name = %s, address = %s, city = %s WHERE id = %s RETURNING *",
                     (name, address, city, point_id)
@@ -164,34 +626,21 @@ def handler(event: dict, context):
                     (name, address, point_id)
                 )
             point = cursor.fetchone()
+            if point:
+                bump_cache_version(cursor, 'delivery_points' if action == 'delivery' else 'pickup_points')
             conn.commit()
             
             if point:
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(point), default=str),
-                    'isBase64Encoded': False
-                }
+                return json_response(200, dict(point))
             else:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Пункт выдачи не найден'}),
-                    'isBase64Encoded': False
-                }
+                return json_response(404, {'error': 'Пункт выдачи не найден'})
         
         elif method == 'DELETE':
             body = json.loads(event.get('body', '{}'))
             point_id = body.get('id')
             
             if not point_id:
-                return {
-                    'statusCode': 400,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'ID обязателен'}),
-                    'isBase64Encoded': False
-                }
+                return json_response(400, {'error': 'ID обязателен'})
             
             if action == 'delivery':
                 cursor.execute(
@@ -204,39 +653,21 @@ def handler(event: dict, context):
                     (point_id,)
                 )
             point = cursor.fetchone()
+            if point:
+                bump_cache_version(cursor, 'delivery_points' if action == 'delivery' else 'pickup_points')
             conn.commit()
             
             if point:
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True}),
-                    'isBase64Encoded': False
-                }
+                return json_response(200, {'success': True})
             else:
-                return {
-                    'statusCode': 404,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Пункт выдачи не найден'}),
-                    'isBase64Encoded': False
-                }
+                return json_response(404, {'error': 'Пункт выдачи не найден'})
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
+        return json_response(405, {'error': 'Метод не поддерживается'})
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        return json_response(500, {'error': str(e)})
     finally:
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
-            conn.close()
+            release_db_connection(conn)
@@ -1,27 +1,420 @@
+import base64
+import gzip
+import hashlib
+import hmac
 import json
+import math
 import os
+import select
+import threading
+import time
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from datetime import date, datetime
+from decimal import Decimal
+from functools import wraps
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_MAX_IDLE_SECONDS = float(os.environ.get('DB_POOL_MAX_IDLE_SECONDS', '300'))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTHCHECK_SECONDS', '30'))
+
+RESPONSE_COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+RESPONSE_GZIP_LEVEL = 6
+RESPONSE_BROTLI_QUALITY = 5
+
+REFERENCE_CACHE_TTL_SECONDS = float(os.environ.get('REFERENCE_CACHE_TTL_SECONDS', '0'))
+REFERENCE_CACHE_MAX_AGE_SECONDS = int(os.environ.get('REFERENCE_CACHE_MAX_AGE_SECONDS', '0'))
+
+_db_pool = []
+_db_pool_lock = threading.Lock()
+
+REFERENCE_QUERIES = {
+    'settings': "SELECT * FROM settings ORDER BY key",
+    'statuses': "SELECT * FROM order_statuses WHERE is_active = TRUE ORDER BY order_position",
+    'faq': "SELECT * FROM faq WHERE is_active = TRUE ORDER BY order_position",
+    'pickup_points': "SELECT * FROM pickup_points WHERE is_active = TRUE ORDER BY name",
+    'delivery_points': "SELECT * FROM delivery_points_abkhazia WHERE is_active = TRUE ORDER BY city, name",
+}
+
+SETTINGS_SCHEMA = {
+    'company_name': 'text',
+    'support_phone': 'text',
+    'support_email': 'text',
+    'tariff_standard': 'number',
+    'tariff_optimal': 'number',
+    'tariff_volume_factor': 'number',
+    'tariff_rules': 'json',
+    'chat_enabled': 'bool',
+    'chat_phone': 'text',
+    'chat_telegram': 'text',
+    'chat_whatsapp': 'text',
+}
+
+BOOTSTRAP_RESOURCES = ('settings', 'statuses', 'faq', 'pickup_points', 'delivery_points')
+
+_reference_cache = {}
+
+def _close_quietly(conn):
+    """Закрывает соединение, игнорируя ошибки"""
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _is_connection_alive(conn) -> bool:
+    """Проверяет, что соединение из пула еще живо"""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def _has_pending_input(conn) -> bool:
+    """Без запроса к серверу проверяет, не закрыл ли сервер соединение: живому соединению в простое читать нечего"""
+    try:
+        readable, _, _ = select.select([conn], [], [], 0)
+    except (OSError, ValueError, psycopg2.Error):
+        return True
+    return bool(readable)
 
 def get_db_connection():
-    """Создает подключение к базе данных"""
+    """Берет теплое соединение из пула или создает новое"""
+    while True:
+        with _db_pool_lock:
+            if not _db_pool:
+                break
+            conn, released_at = _db_pool.pop()
+        idle_seconds = time.monotonic() - released_at
+        if conn.closed or idle_seconds > DB_POOL_MAX_IDLE_SECONDS or _has_pending_input(conn):
+            _close_quietly(conn)
+            continue
+        if idle_seconds > DB_POOL_HEALTHCHECK_SECONDS and not _is_connection_alive(conn):
+            _close_quietly(conn)
+            continue
+        return conn
     return psycopg2.connect(os.environ['DATABASE_URL'])
 
+def release_db_connection(conn):
+    """Возвращает соединение в пул между вызовами, сломанные и лишние закрывает"""
+    if conn.closed:
+        return
+    try:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        _close_quietly(conn)
+        return
+    
+    now = time.monotonic()
+    evicted = []
+    with _db_pool_lock:
+        alive = []
+        for pooled, released_at in _db_pool:
+            if now - released_at > DB_POOL_MAX_IDLE_SECONDS:
+                evicted.append(pooled)
+            else:
+                alive.append((pooled, released_at))
+        _db_pool[:] = alive
+        if len(_db_pool) < DB_POOL_MAX_SIZE:
+            _db_pool.append((conn, now))
+        else:
+            evicted.append(conn)
+    for stale in evicted:
+        _close_quietly(stale)
+
+def encode_json_value(value):
+    """Приводит типы из строк БД к JSON: Decimal в число, дату и время в ISO 8601"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def dumps_json(data) -> str:
+    """Сериализует данные ответа через orjson, если он установлен, иначе стандартным json"""
+    if orjson is not None:
+        return orjson.dumps(data, default=encode_json_value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data, default=encode_json_value, ensure_ascii=False, separators=(',', ':'))
+
+def build_response(status_code: int, body: str, headers: dict = None, is_base64: bool = False) -> dict:
+    """Ответ функции с CORS и JSON по умолчанию; headers дополняют или заменяют заголовки"""
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*', **(headers or {})},
+        'body': body,
+        'isBase64Encoded': is_base64
+    }
+
+def json_response(status_code: int, data, headers: dict = None) -> dict:
+    """JSON-ответ функции"""
+    return build_response(status_code, dumps_json(data), headers)
+
+def accepted_encodings(event: dict) -> set:
+    """Кодировки сжатия из Accept-Encoding, кроме отключенных через q=0"""
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    encodings = set()
+    for part in (headers.get('accept-encoding') or '').split(','):
+        name, _, params = part.partition(';')
+        if params.replace(' ', '').lower() in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+def compress_response(event: dict, response: dict) -> dict:
+    """Сжимает текстовое тело ответа br или gzip, если оно больше порога и клиент это принимает"""
+    body = response.get('body')
+    headers = response.get('headers') or {}
+    if response.get('isBase64Encoded') or not body or 'Content-Encoding' in headers:
+        return response
+    data = body.encode()
+    if len(data) < RESPONSE_COMPRESS_MIN_BYTES:
+        return response
+    
+    encodings = accepted_encodings(event)
+    if brotli is not None and 'br' in encodings:
+        encoding, compressed = 'br', brotli.compress(data, quality=RESPONSE_BROTLI_QUALITY)
+    elif 'gzip' in encodings:
+        encoding, compressed = 'gzip', gzip.compress(data, compresslevel=RESPONSE_GZIP_LEVEL)
+    else:
+        return response
+    return {
+        **response,
+        'headers': {**headers, 'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'},
+        'body': base64.b64encode(compressed).decode(),
+        'isBase64Encoded': True
+    }
+
+def compressed_responses(handler_func):
+    """Сжимает крупные ответы обработчика по Accept-Encoding клиента"""
+    @wraps(handler_func)
+    def wrapper(event: dict, context):
+        return compress_response(event, handler_func(event, context))
+    return wrapper
+
+def bump_cache_version(cursor, resource: str):
+    """Увеличивает версию справочника, чтобы теплые экземпляры функций сбросили кеш"""
+    cursor.execute(
+        "UPDATE cache_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE resource = %s",
+        (resource,)
+    )
+
+def load_references(cursor, resources) -> dict:
+    """Читает справочники через кеш экземпляра: версии сверяются одним запросом, данные перечитываются только при смене версии"""
+    now = time.monotonic()
+    entries = {}
+    unchecked = []
+    for resource in resources:
+        entry = _reference_cache.get(resource)
+        if entry and now - entry['checked_at'] < REFERENCE_CACHE_TTL_SECONDS:
+            entries[resource] = entry
+        else:
+            unchecked.append(resource)
+    
+    if unchecked:
+        cursor.execute(
+            "SELECT resource, version FROM cache_versions WHERE resource = ANY(%s)",
+            (unchecked,)
+        )
+        versions = {row['resource']: row['version'] for row in cursor.fetchall()}
+        
+        for resource in unchecked:
+            version = versions.get(resource, 0)
+            entry = _reference_cache.get(resource)
+            if not entry or entry['version'] != version:
+                cursor.execute(REFERENCE_QUERIES[resource])
+                rows = cursor.fetchall()
+                if resource == 'settings':
+                    data = {row['key']: row['value'] for row in rows}
+                else:
+                    data = [dict(row) for row in rows]
+                entry = {'version': version, 'body': dumps_json(data)}
+            entry['checked_at'] = now
+            _reference_cache[resource] = entry
+            entries[resource] = entry
+    
+    return entries
+
+def _is_finite_number(value) -> bool:
+    """Число (не bool), отличное от NaN и бесконечности"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def validate_tariff_rules(rules: dict):
+    """Проверяет структуру tariff_rules, которую функция заказов компилирует в таблицу тарифов"""
+    unknown = sorted(set(rules) - {'weight_bands', 'city_multipliers', 'delivery_type_surcharges'})
+    if unknown:
+        raise ValueError(f"Неизвестные правила тарифа: {', '.join(unknown)}")
+    
+    bands = rules.get('weight_bands')
+    if bands is not None:
+        if not isinstance(bands, list) or not bands or not all(
+            isinstance(band, dict) and _is_finite_number(band.get('from')) and band['from'] >= 0
+            and _is_finite_number(band.get('rate')) and band['rate'] > 0
+            for band in bands
+        ):
+            raise ValueError('weight_bands: непустой список {"from": вес ≥ 0, "rate": ставка > 0}')
+    
+    multipliers = rules.get('city_multipliers')
+    if multipliers is not None:
+        if not isinstance(multipliers, dict) or not all(
+            _is_finite_number(value) and value > 0 for value in multipliers.values()
+        ):
+            raise ValueError('city_multipliers: объект {"город": множитель > 0}')
+    
+    surcharges = rules.get('delivery_type_surcharges')
+    if surcharges is not None:
+        if not isinstance(surcharges, dict) or not all(_is_finite_number(value) for value in surcharges.values()):
+            raise ValueError('delivery_type_surcharges: объект {"тип доставки": надбавка в ₽}')
+
+def validate_settings(body) -> list:
+    """Проверяет ключи и значения настроек по SETTINGS_SCHEMA и приводит значения к строкам"""
+    if not isinstance(body, dict) or not body:
+        raise ValueError('Нет настроек для сохранения')
+    
+    unknown = sorted(set(body) - set(SETTINGS_SCHEMA))
+    if unknown:
+        raise ValueError(f"Неизвестные настройки: {', '.join(unknown)}")
+    
+    values = []
+    for key, value in body.items():
+        kind = SETTINGS_SCHEMA[key]
+        if kind == 'number':
+            try:
+                valid = math.isfinite(float(value)) and float(value) > 0
+            except (TypeError, ValueError):
+                valid = False
+            if not valid:
+                raise ValueError(f'Настройка {key} должна быть положительным числом')
+            value = str(value)
+        elif kind == 'bool':
+            value = str(value).lower()
+            if value not in ('true', 'false'):
+                raise ValueError(f'Настройка {key} должна быть true или false')
+        elif kind == 'json':
+            try:
+                parsed = json.loads(value) if isinstance(value, str) else value
+            except ValueError:
+                parsed = None
+            if not isinstance(parsed, dict):
+                raise ValueError(f'Настройка {key} должна быть JSON-объектом')
+            if key == 'tariff_rules':
+                validate_tariff_rules(parsed)
+            value = json.dumps(parsed, ensure_ascii=False)
+        else:
+            value = '' if value is None else str(value)
+        values.append((key, value))
+    
+    return values
+
+def load_reference(cursor, resource: str) -> dict:
+    """Читает один справочник через кеш экземпляра"""
+    return load_references(cursor, [resource])[resource]
+
+def invalidate_reference(resource: str):
+    """Сбрасывает справочник из кеша экземпляра после записи"""
+    _reference_cache.pop(resource, None)
+
+def make_etag(resource: str, version) -> str:
+    """Собирает ETag справочника по его версии"""
+    return f'W/"{resource}-{version}"'
+
+def cache_headers(etag: str) -> dict:
+    """Заголовки кеширования для справочных данных"""
+    return {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={REFERENCE_CACHE_MAX_AGE_SECONDS}, must-revalidate',
+        'Access-Control-Expose-Headers': 'ETag',
+    }
+
+def is_not_modified(event: dict, etag: str) -> bool:
+    """Проверяет If-None-Match запроса против текущего ETag"""
+    headers = event.get('headers') or {}
+    if_none_match = next((value for key, value in headers.items() if key.lower() == 'if-none-match'), None)
+    if not if_none_match:
+        return False
+    return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+def not_modified_response(etag: str) -> dict:
+    """Ответ 304 без тела"""
+    return build_response(304, '', headers=cache_headers(etag))
+
+def _b64url_encode(data: bytes) -> str:
+    """Кодирует байты в base64url без выравнивания"""
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64url_decode(data: str) -> bytes:
+    """Декодирует base64url без выравнивания"""
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def _sign_session_payload(payload: str) -> str:
+    """Подписывает полезную нагрузку токена сессии секретом SESSION_SECRET"""
+    secret = os.environ['SESSION_SECRET'].encode()
+    return _b64url_encode(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+
+def verify_session_token(token: str):
+    """Проверяет подпись и срок действия токена сессии без обращения к БД"""
+    if not os.environ.get('SESSION_SECRET'):
+        return None
+    try:
+        payload, signature = token.split('.')
+        if not hmac.compare_digest(signature, _sign_session_payload(payload)):
+            return None
+        session = json.loads(_b64url_decode(payload))
+    except (KeyError, ValueError):
+        return None
+    if session.get('exp', 0) < time.time():
+        return None
+    return session
+
+def get_session(event: dict):
+    """Достает сессию из заголовка X-Auth-Token или Authorization: Bearer"""
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    token = headers.get('x-auth-token') or ''
+    if not token and headers.get('authorization', '').startswith('Bearer '):
+        token = headers['authorization'][len('Bearer '):]
+    return verify_session_token(token.strip()) if token else None
+
+def admin_required(event: dict):
+    """Возвращает ответ 401/403, если запрос пришел не от администратора, иначе None"""
+    session = get_session(event)
+    if session and session.get('adm'):
+        return None
+    return json_response(403 if session else 401, {'error': 'Доступно только администратору' if session else 'Требуется авторизация'})
+
+@compressed_responses
 def handler(event: dict, context):
     """API для управления настройками сайта и FAQ"""
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, PUT, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+        return build_response(200, '', headers={
+            'Access-Control-Allow-Methods': 'GET, PUT, POST, DELETE, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type, X-Auth-Token, Authorization'
+        })
+    
+    if method == 'PUT' and (event.get('queryStringParameters') or {}).get('resource', 'settings') == 'settings':
+        # Схема настроек публична, поэтому некорректный запрос отклоняется до проверки сессии
+        try:
+            settings_values = validate_settings(json.loads(event.get('body') or '{}'))
+        except ValueError as e:
+            return json_response(400, {'error': str(e)})
+    
+    if method != 'GET':
+        denied = admin_required(event)
+        if denied:
+            return denied
     
     try:
         conn = get_db_connection()
@@ -30,16 +423,23 @@ def handler(event: dict, context):
         params = event.get('queryStringParameters', {}) or {}
         resource = params.get('resource', 'settings')
         
-        if resource == 'statuses':
+        if resource == 'bootstrap':
             if method == 'GET':
-                cursor.execute("SELECT * FROM order_statuses WHERE is_active = TRUE ORDER BY order_position")
-                statuses = cursor.fetchall()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(item) for item in statuses], default=str),
-                    'isBase64Encoded': False
-                }
+                references = load_references(cursor, BOOTSTRAP_RESOURCES)
+                etag = make_etag('bootstrap', '-'.join(str(references[name]['version']) for name in BOOTSTRAP_RESOURCES))
+                if is_not_modified(event, etag):
+                    return not_modified_response(etag)
+                
+                return build_response(200, '{' + ', '.join(f'"{name}": {references[name]["body"]}' for name in BOOTSTRAP_RESOURCES) + '}', headers=cache_headers(etag))
+        
+        elif resource == 'statuses':
+            if method == 'GET':
+                reference = load_reference(cursor, 'statuses')
+                etag = make_etag('statuses', reference['version'])
+                if is_not_modified(event, etag):
+                    return not_modified_response(etag)
+                
+                return build_response(200, reference['body'], headers=cache_headers(etag))
             
             elif method == 'POST':
                 body = json.loads(event.get('body', '{}'))
@@ -49,71 +449,50 @@ def handler(event: dict, context):
                 order_position = body.get('order_position', 0)
                 
                 if not status_key or not status_label:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Ключ и название статуса обязательны'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'Ключ и название статуса обязательны'})
                 
                 cursor.execute(
                     "INSERT INTO order_statuses (status_key, status_label, status_color, order_position) VALUES (%s, %s, %s, %s) RETURNING *",
                     (status_key, status_label, status_color, order_position)
                 )
                 status_item = cursor.fetchone()
+                if status_item:
+                    bump_cache_version(cursor, 'statuses')
                 conn.commit()
+                invalidate_reference('statuses')
                 
-                return {
-                    'statusCode': 201,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(status_item), default=str),
-                    'isBase64Encoded': False
-                }
+                return json_response(201, dict(status_item))
             
             elif method == 'DELETE':
                 body = json.loads(event.get('body', '{}'))
                 status_id = body.get('id')
                 
                 if not status_id:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'ID обязателен'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'ID обязателен'})
                 
                 cursor.execute(
                     "UPDATE order_statuses SET is_active = FALSE WHERE id = %s RETURNING *",
                     (status_id,)
                 )
                 status_item = cursor.fetchone()
+                if status_item:
+                    bump_cache_version(cursor, 'statuses')
                 conn.commit()
+                invalidate_reference('statuses')
                 
                 if status_item:
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'success': True}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(200, {'success': True})
                 else:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Статус не найден'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(404, {'error': 'Статус не найден'})
         
         elif resource == 'faq':
             if method == 'GET':
-                cursor.execute("SELECT * FROM faq WHERE is_active = TRUE ORDER BY order_position")
-                faq_items = cursor.fetchall()
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(item) for item in faq_items], default=str),
-                    'isBase64Encoded': False
-                }
+                reference = load_reference(cursor, 'faq')
+                etag = make_etag('faq', reference['version'])
+                if is_not_modified(event, etag):
+                    return not_modified_response(etag)
+                
+                return build_response(200, reference['body'], headers=cache_headers(etag))
             
             elif method == 'POST':
                 body = json.loads(event.get('body', '{}'))
@@ -122,26 +501,19 @@ def handler(event: dict, context):
                 order_position = body.get('order_position', 0)
                 
                 if not question or not answer:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'Вопрос и ответ обязательны'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'Вопрос и ответ обязательны'})
                 
                 cursor.execute(
                     "INSERT INTO faq (question, answer, order_position) VALUES (%s, %s, %s) RETURNING *",
                     (question, answer, order_position)
                 )
                 faq_item = cursor.fetchone()
+                if faq_item:
+                    bump_cache_version(cursor, 'faq')
                 conn.commit()
+                invalidate_reference('faq')
                 
-                return {
-                    'statusCode': 201,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(dict(faq_item), default=str),
-                    'isBase64Encoded': False
-                }
+                return json_response(201, dict(faq_item))
             
             elif method == 'PUT':
                 body = json.loads(event.get('body', '{}'))
@@ -151,121 +523,81 @@ def handler(event: dict, context):
                 order_position = body.get('order_position', 0)
                 
                 if not faq_id:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'ID обязателен'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'ID обязателен'})
                 
                 cursor.execute(
                     "UPDATE faq SET question = %s, answer = %s, order_position = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s RETURNING *",
                     (question, answer, order_position, faq_id)
                 )
                 faq_item = cursor.fetchone()
+                if faq_item:
+                    bump_cache_version(cursor, 'faq')
                 conn.commit()
+                invalidate_reference('faq')
                 
                 if faq_item:
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps(dict(faq_item), default=str),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(200, dict(faq_item))
                 else:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'FAQ не найден'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(404, {'error': 'FAQ не найден'})
             
             elif method == 'DELETE':
                 body = json.loads(event.get('body', '{}'))
                 faq_id = body.get('id')
                 
                 if not faq_id:
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'ID обязателен'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(400, {'error': 'ID обязателен'})
                 
                 cursor.execute(
                     "UPDATE faq SET is_active = FALSE WHERE id = %s RETURNING *",
                     (faq_id,)
                 )
                 faq_item = cursor.fetchone()
+                if faq_item:
+                    bump_cache_version(cursor, 'faq')
                 conn.commit()
+                invalidate_reference('faq')
                 
                 if faq_item:
-                    return {
-                        'statusCode': 200,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'success': True}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(200, {'success': True})
                 else:
-                    return {
-                        'statusCode': 404,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': 'FAQ не найден'}),
-                        'isBase64Encoded': False
-                    }
+                    return json_response(404, {'error': 'FAQ не найден'})
         
         elif resource == 'settings':
             if method == 'GET':
-                cursor.execute("SELECT * FROM settings ORDER BY key")
-                settings = cursor.fetchall()
-                settings_dict = {setting['key']: setting['value'] for setting in settings}
+                reference = load_reference(cursor, 'settings')
+                etag = make_etag('settings', reference['version'])
+                if is_not_modified(event, etag):
+                    return not_modified_response(etag)
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(settings_dict),
-                    'isBase64Encoded': False
-                }
+                return build_response(200, reference['body'], headers=cache_headers(etag))
             
             elif method == 'PUT':
-                body = json.loads(event.get('body', '{}'))
-                
-                for key, value in body.items():
-                    cursor.execute(
-                        """INSERT INTO settings (key, value) VALUES (%s, %s)
-                           ON CONFLICT (key) DO UPDATE SET value = %s, updated_at = CURRENT_TIMESTAMP""",
-                        (key, str(value), str(value))
-                    )
-                
+                settings = execute_values(
+                    cursor,
+                    """WITH upserted AS (
+                           INSERT INTO settings (key, value) VALUES %s
+                           ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = CURRENT_TIMESTAMP
+                           RETURNING key, value
+                       )
+                       SELECT key, value FROM upserted
+                       UNION ALL
+                       SELECT key, value FROM settings WHERE key NOT IN (SELECT key FROM upserted)""",
+                    settings_values,
+                    page_size=len(settings_values),
+                    fetch=True
+                )
+                bump_cache_version(cursor, 'settings')
                 conn.commit()
+                invalidate_reference('settings')
                 
-                cursor.execute("SELECT * FROM settings ORDER BY key")
-                settings = cursor.fetchall()
-                settings_dict = {setting['key']: setting['value'] for setting in settings}
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(settings_dict),
-                    'isBase64Encoded': False
-                }
+                return json_response(200, {setting['key']: setting['value'] for setting in sorted(settings, key=lambda row: row['key'])})
         
-        return {
-            'statusCode': 405,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
+        return json_response(405, {'error': 'Метод не поддерживается'})
         
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        return json_response(500, {'error': str(e)})
     finally:
         if 'cursor' in locals():
             cursor.close()
         if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+            release_db_connection(conn)
\ No newline at end of file
@@ -0,0 +1,8 @@
+-- Индексы для постраничного списка заказов (курсор по created_at, id)
+CREATE INDEX IF NOT EXISTS idx_orders_created_at_id ON orders(created_at DESC, id DESC);
+
+-- Композитные индексы под фильтры списка заказов
+CREATE INDEX IF NOT EXISTS idx_orders_status_created_at_id ON orders(status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_delivery_type_created_at_id ON orders(delivery_type, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_pickup_point_created_at_id ON orders(pickup_point_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_delivery_point_created_at_id ON orders(delivery_point_id, created_at DESC, id DESC);
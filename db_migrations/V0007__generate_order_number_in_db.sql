@@ -0,0 +1,11 @@
+-- Последовательность для номеров заказов, продолжает нумерацию по id
+CREATE SEQUENCE IF NOT EXISTS order_number_seq;
+SELECT setval('order_number_seq', COALESCE((SELECT MAX(id) FROM orders), 0) + 1, FALSE);
+
+-- Формат BB-001, для номеров больше 999 без обрезки
+CREATE OR REPLACE FUNCTION next_order_number() RETURNS VARCHAR AS $$
+    SELECT 'BB-' || CASE WHEN n < 1000 THEN lpad(n::text, 3, '0') ELSE n::text END
+    FROM nextval('order_number_seq') AS n
+$$ LANGUAGE sql VOLATILE;
+
+ALTER TABLE orders ALTER COLUMN order_number SET DEFAULT next_order_number();
@@ -0,0 +1,19 @@
+-- Версии справочных данных: увеличиваются при каждой записи, по ним теплые экземпляры функций сбрасывают кеши
+CREATE TABLE IF NOT EXISTS cache_versions (
+    resource VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO cache_versions (resource) VALUES
+    ('settings'),
+    ('faq'),
+    ('statuses'),
+    ('pickup_points'),
+    ('delivery_points')
+ON CONFLICT (resource) DO NOTHING;
+
+-- Расширенные правила тарифа: весовые диапазоны, множители по городам, надбавки по типу доставки
+INSERT INTO settings (key, value, description) VALUES
+    ('tariff_rules', '{}', 'Правила тарифа (JSON): weight_bands, city_multipliers, delivery_type_surcharges')
+ON CONFLICT (key) DO NOTHING;
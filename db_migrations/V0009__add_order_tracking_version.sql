@@ -0,0 +1,3 @@
+-- Версия для кеша отслеживания заказов, увеличивается при смене статуса
+INSERT INTO cache_versions (resource) VALUES ('order_tracking')
+ON CONFLICT (resource) DO NOTHING;
@@ -0,0 +1,27 @@
+-- Журнал смен статусов заказов (только добавление)
+CREATE TABLE IF NOT EXISTS order_status_events (
+    id BIGSERIAL PRIMARY KEY,
+    order_id INTEGER NOT NULL REFERENCES orders(id),
+    from_status VARCHAR(50),
+    to_status VARCHAR(50) NOT NULL,
+    dwell_seconds INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Хронология заказа и выборки по диапазонам времени
+CREATE INDEX IF NOT EXISTS idx_order_status_events_order ON order_status_events(order_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_order_status_events_created_at ON order_status_events USING BRIN (created_at);
+
+-- Гистограмма времени нахождения заказов в каждом статусе (логарифмические корзины)
+CREATE TABLE IF NOT EXISTS order_stage_dwell_stats (
+    stage VARCHAR(50) NOT NULL,
+    bucket INTEGER NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (stage, bucket)
+);
+
+-- Начальное событие для уже существующих заказов
+INSERT INTO order_status_events (order_id, from_status, to_status, created_at)
+SELECT o.id, NULL, o.status, o.created_at
+FROM orders o
+WHERE NOT EXISTS (SELECT 1 FROM order_status_events e WHERE e.order_id = o.id);
@@ -0,0 +1,13 @@
+-- Статусы заказов проверяются по справочнику order_statuses вместо фиксированного CHECK
+ALTER TABLE orders DROP CONSTRAINT IF EXISTS orders_status_check;
+
+-- Статусы, которые уже встречаются в заказах, должны быть в справочнике
+INSERT INTO order_statuses (status_key, status_label)
+SELECT DISTINCT o.status, o.status
+FROM orders o
+WHERE NOT EXISTS (SELECT 1 FROM order_statuses s WHERE s.status_key = o.status)
+ON CONFLICT (status_key) DO NOTHING;
+
+ALTER TABLE orders
+    ADD CONSTRAINT orders_status_fk FOREIGN KEY (status) REFERENCES order_statuses(status_key) ON UPDATE CASCADE;
+
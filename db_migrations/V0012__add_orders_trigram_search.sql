@@ -0,0 +1,10 @@
+-- Триграммный поиск заказов по частичному совпадению
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_orders_recipient_name_trgm ON orders USING GIN (recipient_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_orders_delivery_address_trgm ON orders USING GIN (delivery_address gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_orders_order_number_trgm ON orders USING GIN (order_number gin_trgm_ops);
+
+-- Телефон ищется по цифрам, без пробелов, скобок и плюса
+CREATE INDEX IF NOT EXISTS idx_orders_recipient_phone_digits_trgm
+    ON orders USING GIN ((regexp_replace(recipient_phone, '\D', '', 'g')) gin_trgm_ops);
@@ -0,0 +1,6 @@
+-- Покрывающий индекс для списка заказов в личном кабинете (index-only scan без сортировки)
+CREATE INDEX IF NOT EXISTS idx_orders_user_created_at_id ON orders(user_id, created_at DESC, id DESC)
+    INCLUDE (order_number, status, recipient_name, recipient_phone, weight, price, delivery_type);
+
+-- Старый индекс по user_id покрывается новым составным
+DROP INDEX IF EXISTS idx_orders_user_id;
@@ -0,0 +1,103 @@
+-- Дневные агрегаты заказов для дашборда: день × статус × тип доставки × пункт выдачи
+CREATE TABLE IF NOT EXISTS order_daily_rollups (
+    day DATE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    delivery_type VARCHAR(20) NOT NULL,
+    delivery_point_id INTEGER NOT NULL DEFAULT 0,
+    orders_count BIGINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    weight DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status, delivery_type, delivery_point_id)
+);
+
+-- Агрегаты пересчитываются один раз на оператор, а не на каждую строку:
+-- изменения сворачиваются по ключу агрегата и применяются в порядке ключа,
+-- поэтому параллельные пачки заказов не держат одну строку дольше нужного и не взаимоблокируются
+CREATE OR REPLACE FUNCTION orders_rollup_statement_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO order_daily_rollups AS r (day, status, delivery_type, delivery_point_id, orders_count, revenue, weight)
+        SELECT COALESCE(created_at, CURRENT_TIMESTAMP)::date, status, delivery_type, COALESCE(delivery_point_id, 0),
+               COUNT(*), SUM(price), SUM(weight)
+        FROM new_orders
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (day, status, delivery_type, delivery_point_id) DO UPDATE SET
+            orders_count = r.orders_count + EXCLUDED.orders_count,
+            revenue = r.revenue + EXCLUDED.revenue,
+            weight = r.weight + EXCLUDED.weight;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO order_daily_rollups AS r (day, status, delivery_type, delivery_point_id, orders_count, revenue, weight)
+        SELECT COALESCE(created_at, CURRENT_TIMESTAMP)::date, status, delivery_type, COALESCE(delivery_point_id, 0),
+               -COUNT(*), -SUM(price), -SUM(weight)
+        FROM old_orders
+        GROUP BY 1, 2, 3, 4
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (day, status, delivery_type, delivery_point_id) DO UPDATE SET
+            orders_count = r.orders_count + EXCLUDED.orders_count,
+            revenue = r.revenue + EXCLUDED.revenue,
+            weight = r.weight + EXCLUDED.weight;
+    ELSE
+        -- Обновления, не меняющие ключ и суммы (например, только updated_at), взаимно сокращаются
+        INSERT INTO order_daily_rollups AS r (day, status, delivery_type, delivery_point_id, orders_count, revenue, weight)
+        SELECT day, status, delivery_type, delivery_point_id, SUM(direction), SUM(price), SUM(weight)
+        FROM (
+            SELECT COALESCE(created_at, CURRENT_TIMESTAMP)::date AS day, status, delivery_type,
+                   COALESCE(delivery_point_id, 0) AS delivery_point_id, 1 AS direction, price, weight
+            FROM new_orders
+            UNION ALL
+            SELECT COALESCE(created_at, CURRENT_TIMESTAMP)::date, status, delivery_type,
+                   COALESCE(delivery_point_id, 0), -1, -price, -weight
+            FROM old_orders
+        ) changes
+        GROUP BY 1, 2, 3, 4
+        HAVING SUM(direction) <> 0 OR SUM(price) <> 0 OR SUM(weight) <> 0
+        ORDER BY 1, 2, 3, 4
+        ON CONFLICT (day, status, delivery_type, delivery_point_id) DO UPDATE SET
+            orders_count = r.orders_count + EXCLUDED.orders_count,
+            revenue = r.revenue + EXCLUDED.revenue,
+            weight = r.weight + EXCLUDED.weight;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Таблицы переходов нельзя объявить для триггера на несколько событий или со списком колонок
+DROP TRIGGER IF EXISTS orders_rollup_insert ON orders;
+CREATE TRIGGER orders_rollup_insert
+    AFTER INSERT ON orders
+    REFERENCING NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION orders_rollup_statement_trigger();
+
+DROP TRIGGER IF EXISTS orders_rollup_update ON orders;
+CREATE TRIGGER orders_rollup_update
+    AFTER UPDATE ON orders
+    REFERENCING OLD TABLE AS old_orders NEW TABLE AS new_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION orders_rollup_statement_trigger();
+
+DROP TRIGGER IF EXISTS orders_rollup_delete ON orders;
+CREATE TRIGGER orders_rollup_delete
+    AFTER DELETE ON orders
+    REFERENCING OLD TABLE AS old_orders
+    FOR EACH STATEMENT EXECUTE FUNCTION orders_rollup_statement_trigger();
+
+-- Пересчет агрегатов по существующим заказам: SELECT backfill_order_daily_rollups();
+-- или за период: SELECT backfill_order_daily_rollups('2026-01-01', '2026-02-01');
+CREATE OR REPLACE FUNCTION backfill_order_daily_rollups(date_from DATE DEFAULT NULL, date_to DATE DEFAULT NULL)
+RETURNS BIGINT AS $$
+    DELETE FROM order_daily_rollups
+    WHERE (date_from IS NULL OR day >= date_from) AND (date_to IS NULL OR day < date_to);
+    
+    WITH inserted AS (
+        INSERT INTO order_daily_rollups (day, status, delivery_type, delivery_point_id, orders_count, revenue, weight)
+        SELECT COALESCE(created_at, CURRENT_TIMESTAMP)::date, status, delivery_type, COALESCE(delivery_point_id, 0),
+               COUNT(*), SUM(price), SUM(weight)
+        FROM orders
+        WHERE (date_from IS NULL OR created_at >= date_from) AND (date_to IS NULL OR created_at < date_to)
+        GROUP BY 1, 2, 3, 4
+        RETURNING orders_count
+    )
+    SELECT COALESCE(SUM(orders_count), 0)::BIGINT FROM inserted
+$$ LANGUAGE sql;
+
+SELECT backfill_order_daily_rollups();
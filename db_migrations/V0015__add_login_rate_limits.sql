@@ -0,0 +1,10 @@
+-- Общее между экземплярами состояние ограничителя попыток входа (token bucket по email и IP).
+-- Таблица нежурналируемая: после сбоя сервера сброс счетчиков допустим, а запись не нагружает WAL
+CREATE UNLOGGED TABLE IF NOT EXISTS login_rate_limits (
+    key VARCHAR(320) PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Очистка полностью восстановившихся корзин
+CREATE INDEX IF NOT EXISTS idx_login_rate_limits_updated_at ON login_rate_limits(updated_at);
@@ -0,0 +1,28 @@
+-- Email хранится в нижнем регистре: регистрация и вход сравнивают нормализованный ключ.
+-- Из адресов, совпадающих после нормализации, приводится только самый старый, если нормализованного еще нет;
+-- остальные остаются как есть, и вход находит их запасным поиском по индексу ниже
+UPDATE users u SET email = LOWER(TRIM(u.email))
+WHERE u.email <> LOWER(TRIM(u.email))
+  AND NOT EXISTS (
+      SELECT 1 FROM users o
+      WHERE o.id <> u.id
+        AND LOWER(TRIM(o.email)) = LOWER(TRIM(u.email))
+        AND (o.email = LOWER(TRIM(o.email)) OR o.id < u.id)
+  );
+
+DO $$
+DECLARE
+    leftovers INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO leftovers FROM users WHERE email <> LOWER(TRIM(email));
+    IF leftovers > 0 THEN
+        RAISE NOTICE 'Пользователей с email, совпадающим с другим после нормализации: %', leftovers;
+    END IF;
+END $$;
+
+-- Частичный индекс покрывает только оставшиеся ненормализованные адреса, новые строки в него не попадают
+CREATE INDEX IF NOT EXISTS idx_users_email_unnormalized ON users (LOWER(TRIM(email)))
+WHERE email <> LOWER(TRIM(email));
+
+-- Ограничение UNIQUE(email) уже создает индекс, отдельный индекс только удваивает запись
+DROP INDEX IF EXISTS idx_users_email;
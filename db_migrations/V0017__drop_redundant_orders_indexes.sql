@@ -0,0 +1,5 @@
+-- Одиночные индексы по status, pickup_point_id и delivery_point_id покрываются
+-- составными индексами (колонка, created_at, id) из V0006 и только замедляют вставку заказов
+DROP INDEX IF EXISTS idx_orders_status;
+DROP INDEX IF EXISTS idx_orders_pickup_point;
+DROP INDEX IF EXISTS idx_orders_delivery_point;
@@ -0,0 +1,43 @@
+"""HTTP-клиент для проверок развернутых функций (только стандартная библиотека)"""
+import json
+import os
+import urllib.error
+import urllib.request
+
+FUNC2URL_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'backend', 'func2url.json')
+
+def function_url(name: str) -> str:
+    """URL функции из backend/func2url.json; переопределяется переменной FUNC_URL_<NAME>"""
+    override = os.environ.get('FUNC_URL_' + name.upper().replace('-', '_'))
+    if override:
+        return override
+    with open(FUNC2URL_PATH) as f:
+        return json.load(f)[name]
+
+def call(name: str, method: str = 'GET', query: str = '', body=None, token: str = None) -> tuple:
+    """Вызывает функцию и возвращает пару (код ответа, разобранное JSON-тело или None)"""
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['X-Auth-Token'] = token
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(function_url(name) + query, data=data, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            status, raw = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, raw = e.code, e.read()
+    try:
+        return status, json.loads(raw) if raw else None
+    except ValueError:
+        return status, None
+
+def admin_token() -> str:
+    """Входит под администратором из ADMIN_EMAIL / ADMIN_PASSWORD и возвращает токен сессии"""
+    status, body = call('auth', 'POST', body={
+        'action': 'login',
+        'email': os.environ['ADMIN_EMAIL'],
+        'password': os.environ['ADMIN_PASSWORD'],
+    })
+    if status != 200 or not body.get('token'):
+        raise SystemExit(f'Не удалось войти под администратором: {status} {body}')
+    return body['token']
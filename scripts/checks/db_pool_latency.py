@@ -0,0 +1,60 @@
+"""Замер задержки соединения с БД: новое соединение на каждый вызов против теплого соединения из пула функции
+
+Запуск: DATABASE_URL=... python scripts/checks/db_pool_latency.py [--iterations 50] [--function orders]
+Пул функции импортируется из ее index.py; каждая итерация берет соединение, выполняет SELECT 1
+и возвращает его. Проверка падает, если медиана с пулом не меньше медианы без него.
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'backend')
+
+def load_function(name: str):
+    """Импортирует index.py функции как отдельный модуль"""
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_') + '_index', os.path.join(BACKEND_DIR, name, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def measure(module, iterations: int, pooled: bool) -> list:
+    """Время в мс на взятие соединения, SELECT 1 и возврат соединения"""
+    timings = []
+    for _ in range(iterations):
+        if not pooled:
+            while module._db_pool:
+                module._close_quietly(module._db_pool.pop()[0])
+        started = time.perf_counter()
+        conn = module.get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        module.release_db_connection(conn)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def describe(timings: list) -> str:
+    """Медиана и 95-й перцентиль в мс"""
+    ordered = sorted(timings)
+    return f'медиана {statistics.median(ordered):.2f} мс, p95 {ordered[int(len(ordered) * 0.95) - 1]:.2f} мс'
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--function', default='orders')
+    args = parser.parse_args()
+    
+    module = load_function(args.function)
+    cold = measure(module, args.iterations, pooled=False)
+    measure(module, 1, pooled=True)
+    warm = measure(module, args.iterations, pooled=True)
+    
+    print(f'Без пула: {describe(cold)}')
+    print(f'С пулом:  {describe(warm)}')
+    return 0 if statistics.median(warm) < statistics.median(cold) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
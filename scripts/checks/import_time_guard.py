@@ -0,0 +1,53 @@
+"""Регрессионная проверка холодного старта: импорт index.py каждой функции укладывается в бюджет
+и не тянет тяжелые модули, которые нужны только отдельным действиям (qrcode и Pillow в pickup-points)
+
+Запуск: python scripts/checks/import_time_guard.py [--budget-ms 300]
+Каждая функция импортируется в отдельном процессе с python -X importtime, нужны зависимости
+из ее requirements.txt.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'backend')
+FORBIDDEN_MODULES = {
+    'pickup-points': ('qrcode', 'PIL'),
+}
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \|\s+(\S.*)$')
+
+def measure(function_dir: str) -> tuple:
+    """Импортирует index.py в чистом процессе; возвращает (время импорта в мс, загруженные модули верхнего уровня)"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'import sys, index; print(",".join(sorted({name.split(".")[0] for name in sys.modules})))'],
+        cwd=function_dir, capture_output=True, text=True, check=True
+    )
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match and match.group(2).strip() == 'index':
+            cumulative_us = int(match.group(1))
+    return cumulative_us / 1000, set(result.stdout.strip().split(','))
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-ms', type=float, default=300)
+    args = parser.parse_args()
+    
+    failed = False
+    for name in sorted(os.listdir(BACKEND_DIR)):
+        function_dir = os.path.join(BACKEND_DIR, name)
+        if not os.path.isfile(os.path.join(function_dir, 'index.py')):
+            continue
+        elapsed_ms, modules = measure(function_dir)
+        leaked = [module for module in FORBIDDEN_MODULES.get(name, ()) if module in modules]
+        over_budget = elapsed_ms > args.budget_ms
+        failed = failed or over_budget or bool(leaked)
+        status = 'FAIL' if over_budget or leaked else 'OK'
+        print(f'{status} {name}: импорт {elapsed_ms:.1f} мс' + (f', лишние модули: {", ".join(leaked)}' if leaked else ''))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Нагрузочная проверка ограничителя входа: при переборе паролей число запросов к БД не растет вместе с числом попыток
+
+Запуск: DATABASE_URL=... SESSION_SECRET=... python scripts/checks/login_rate_limit_load.py [--attempts 2000] [--workers 20]
+Обработчик auth импортируется в этом процессе и работает с настоящей БД; каждый cursor.execute
+считается. Попытки идут с одного IP на один несуществующий email, после исчерпания корзины
+отказы должны обходиться без БД.
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+AUTH_INDEX_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'backend', 'auth', 'index.py')
+ATTACKER_IP = '198.51.100.7'
+
+class CountingCursor:
+    """Курсор, который считает выполненные запросы"""
+    def __init__(self, cursor, counter: dict, lock):
+        self._cursor, self._counter, self._lock = cursor, counter, lock
+    
+    def execute(self, *args, **kwargs):
+        with self._lock:
+            self._counter['queries'] += 1
+        return self._cursor.execute(*args, **kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class CountingConnection:
+    """Соединение, чьи курсоры считают запросы"""
+    def __init__(self, conn, counter: dict, lock):
+        self._conn, self._counter, self._lock = conn, counter, lock
+    
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self._conn.cursor(*args, **kwargs), self._counter, self._lock)
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+def load_auth(counter: dict, lock):
+    """Импортирует обработчик auth и оборачивает выдачу соединений счетчиком запросов"""
+    spec = importlib.util.spec_from_file_location('auth_index', AUTH_INDEX_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    get_connection, release_connection = module.get_db_connection, module.release_db_connection
+    module.get_db_connection = lambda: CountingConnection(get_connection(), counter, lock)
+    module.release_db_connection = lambda conn: release_connection(conn._conn)
+    return module
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--attempts', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=20)
+    args = parser.parse_args()
+    
+    counter, lock = {'queries': 0}, threading.Lock()
+    auth = load_auth(counter, lock)
+    email = f'attack-{int(time.time() * 1000)}@example.com'
+    event = {
+        'httpMethod': 'POST',
+        'headers': {},
+        'requestContext': {'identity': {'sourceIp': ATTACKER_IP}},
+        'body': json.dumps({'action': 'login', 'email': email, 'password': 'wrong-password'}),
+    }
+    
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        statuses = Counter(executor.map(lambda _: auth.handler(dict(event), None)['statusCode'], range(args.attempts)))
+    elapsed = time.monotonic() - started
+    
+    # Каждая пропущенная попытка стоит запроса к корзинам и двух поисков пользователя;
+    # корзина пропускает LOGIN_RATE_CAPACITY попыток и по одной за каждые LOGIN_RATE_REFILL_SECONDS
+    allowed = auth.LOGIN_RATE_CAPACITY + math.ceil(elapsed / auth.LOGIN_RATE_REFILL_SECONDS)
+    budget = 3 * (allowed + args.workers)
+    print(f'Попыток: {args.attempts} за {elapsed:.1f} с, ответы: {dict(statuses)}')
+    print(f'Запросов к БД: {counter["queries"]}, бюджет: {budget}')
+    return 0 if counter['queries'] <= budget and statuses.get(500, 0) == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
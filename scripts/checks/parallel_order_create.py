@@ -0,0 +1,47 @@
+"""Проверка гонки при создании заказов: параллельные POST получают уникальные номера BB-NNN
+
+Запуск: python scripts/checks/parallel_order_create.py [--count 200] [--workers 50]
+Создает настоящие заказы с комментарием parallel-check.
+"""
+import argparse
+import re
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from _client import call
+
+ORDER_NUMBER_PATTERN = re.compile(r'^BB-\d{3,}$')
+
+def create_order(index: int) -> tuple:
+    return call('orders', 'POST', body={
+        'recipient_name': f'Параллельная проверка {index}',
+        'recipient_phone': '+7 900 000 00 00',
+        'delivery_address': 'Сухум, проверка',
+        'weight': 1,
+        'delivery_type': 'home',
+        'comment': 'parallel-check',
+    })
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=50)
+    args = parser.parse_args()
+    
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        responses = list(executor.map(create_order, range(args.count)))
+    
+    failed = [(status, body) for status, body in responses if status != 201]
+    numbers = [body['order_number'] for status, body in responses if status == 201]
+    duplicates = [number for number, count in Counter(numbers).items() if count > 1]
+    malformed = [number for number in numbers if not ORDER_NUMBER_PATTERN.match(number)]
+    
+    print(f'Создано {len(numbers)} из {args.count}, ошибок {len(failed)}, '
+          f'повторов номеров {len(duplicates)}, номеров не в формате BB-NNN {len(malformed)}')
+    for status, body in failed[:5]:
+        print(f'  {status}: {body}')
+    return 0 if not failed and not duplicates and not malformed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""Проверка гонки при регистрации: из параллельных регистраций одного email успешна ровно одна
+
+Запуск: python scripts/checks/parallel_register.py [--count 50]
+Email уникален для каждого запуска и отличается регистром между запросами,
+остальные запросы должны получить 409, а не 500.
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from _client import call
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=50)
+    args = parser.parse_args()
+    
+    local_part = f'parallel-{int(time.time() * 1000)}'
+    
+    def register(index: int) -> int:
+        email = f'{local_part}@example.com'
+        status, _ = call('auth', 'POST', body={
+            'action': 'register',
+            'email': email.upper() if index % 2 else email,
+            'password': 'parallel-check',
+            'name': 'Parallel Check',
+        })
+        return status
+    
+    with ThreadPoolExecutor(max_workers=args.count) as executor:
+        statuses = Counter(executor.map(register, range(args.count)))
+    
+    print(f'Ответы: {dict(statuses)}')
+    expected = Counter({201: 1, 409: args.count - 1})
+    return 0 if statuses == expected else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
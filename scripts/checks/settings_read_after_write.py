@@ -0,0 +1,39 @@
+"""Проверка: чтение настроек сразу после записи возвращает новое значение, а не закешированное
+
+Запуск: ADMIN_EMAIL=... ADMIN_PASSWORD=... python scripts/checks/settings_read_after_write.py
+Меняет support_email на уникальное значение и в конце возвращает прежнее.
+"""
+import sys
+import time
+
+from _client import admin_token, call
+
+def main() -> int:
+    token = admin_token()
+    status, settings = call('settings')
+    if status != 200:
+        print(f'GET настроек вернул {status}')
+        return 1
+    original = settings.get('support_email', '')
+    marker = f'check-{int(time.time() * 1000)}@beribox.ru'
+    
+    try:
+        status, body = call('settings', 'PUT', body={'support_email': marker}, token=token)
+        if status != 200 or body.get('support_email') != marker:
+            print(f'PUT настроек вернул {status}: {body}')
+            return 1
+        
+        for query in ('', '?resource=bootstrap'):
+            status, body = call('settings', query=query)
+            value = (body.get('settings', {}) if query else body).get('support_email')
+            if status != 200 or value != marker:
+                print(f'GET {query or "/"} после записи вернул устаревшее значение: {value!r}')
+                return 1
+    finally:
+        call('settings', 'PUT', body={'support_email': original}, token=token)
+    
+    print('OK: запись настроек сразу видна при чтении')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
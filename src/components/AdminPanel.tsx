@@ -53,10 +53,11 @@ const API_URLS = {
   deliveryPoints: 'https://functions.poehali.dev/d6c2dc90-e5ad-4acd-96f2-7d33568364cb?action=delivery',
   settings: 'https://functions.poehali.dev/1ce5a0f2-5d25-4bbe-b1d8-fbb89ed635fd',
   faq: 'https://functions.poehali.dev/1ce5a0f2-5d25-4bbe-b1d8-fbb89ed635fd?resource=faq',
-  statuses: 'https://functions.poehali.dev/1ce5a0f2-5d25-4bbe-b1d8-fbb89ed635fd?resource=statuses'
+  statuses: 'https://functions.poehali.dev/1ce5a0f2-5d25-4bbe-b1d8-fbb89ed635fd?resource=statuses',
+  bootstrap: 'https://functions.poehali.dev/1ce5a0f2-5d25-4bbe-b1d8-fbb89ed635fd?resource=bootstrap'
 };
 
-const AdminPanel = () => {
+const AdminPanel = ({ authToken }: { authToken: string | null }) => {
   const [faqItems, setFaqItems] = useState<FAQItem[]>([]);
   const [pickupPoints, setPickupPoints] = useState<PickupPoint[]>([]);
   const [deliveryPoints, setDeliveryPoints] = useState<DeliveryPoint[]>([]);
@@ -78,19 +79,14 @@ const AdminPanel = () => {
 
   const fetchAll = async () => {
     try {
-      const [faqRes, pickupRes, deliveryRes, settingsRes, statusesRes] = await Promise.all([
-        fetch(API_URLS.faq),
-        fetch(API_URLS.pickupPoints),
-        fetch(API_URLS.deliveryPoints),
-        fetch(API_URLS.settings),
-        fetch(API_URLS.statuses)
-      ]);
+      const response = await fetch(API_URLS.bootstrap);
+      const data = await response.json();
 
-      setFaqItems(await faqRes.json());
-      setPickupPoints(await pickupRes.json());
-      setDeliveryPoints(await deliveryRes.json());
-      setSettings(await settingsRes.json());
-      setOrderStatuses(await statusesRes.json());
+      setFaqItems(data.faq);
+      setPickupPoints(data.pickup_points);
+      setDeliveryPoints(data.delivery_points);
+      setSettings(data.settings);
+      setOrderStatuses(data.statuses);
     } catch (error) {
       console.error('Ошибка загрузки данных:', error);
     }
@@ -100,7 +96,7 @@ const AdminPanel = () => {
     try {
       await fetch(API_URLS.settings, {
         method: 'PUT',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Auth-Token': authToken || '' },
         body: JSON.stringify(settings)
       });
       toast.success('Настройки сохранены');
@@ -113,7 +109,7 @@ const AdminPanel = () => {
     try {
       await fetch(API_URLS.faq, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Auth-Token': authToken || '' },
         body: JSON.stringify({ question, answer, order_position: faqItems.length + 1 })
       });
       fetchAll();
@@ -127,7 +123,7 @@ const AdminPanel = () => {
     try {
       await fetch(API_URLS.faq, {
         method: 'DELETE',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Auth-Token': authToken || '' },
         body: JSON.stringify({ id })
       });
       fetchAll();
@@ -141,7 +137,7 @@ const AdminPanel = () => {
     try {
       await fetch(API_URLS.pickupPoints, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Auth-Token': authToken || '' },
         body: JSON.stringify({ name, address })
       });
       fetchAll();
@@ -155,7 +151,7 @@ const AdminPanel = () => {
     try {
       await fetch(API_URLS.deliveryPoints, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Auth-Token': authToken || '' },
         body: JSON.stringify({ name, address, city })
       });
       fetchAll();
@@ -169,7 +165,7 @@ const AdminPanel = () => {
     try {
       await fetch(API_URLS.pickupPoints, {
         method: 'DELETE',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Auth-Token': authToken || '' },
         body: JSON.stringify({ id })
       });
       fetchAll();
@@ -183,7 +179,7 @@ const AdminPanel = () => {
     try {
       await fetch(API_URLS.deliveryPoints, {
         method: 'DELETE',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Auth-Token': authToken || '' },
         body: JSON.stringify({ id })
       });
       fetchAll();
@@ -197,7 +193,7 @@ const AdminPanel = () => {
     try {
       await fetch(API_URLS.statuses, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Auth-Token': authToken || '' },
         body: JSON.stringify({ 
           status_key: statusKey, 
           status_label: statusLabel, 
@@ -216,7 +212,7 @@ const AdminPanel = () => {
     try {
       await fetch(API_URLS.statuses, {
         method: 'DELETE',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'X-Auth-Token': authToken || '' },
         body: JSON.stringify({ id })
       });
       fetchAll();
@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useEffect, useState } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
@@ -6,11 +6,39 @@ import { Badge } from '@/components/ui/badge';
 import Icon from '@/components/ui/icon';
 import FadeInSection from '@/components/FadeInSection';
 
+const QUOTE_API_URL = 'https://functions.poehali.dev/4460be83-87c8-4715-bfcb-94d474d9b10f?action=quote';
+
 const Calculator = () => {
   const [weight, setWeight] = useState('');
   const [length, setLength] = useState('');
   const [width, setWidth] = useState('');
   const [height, setHeight] = useState('');
+  const [serverQuote, setServerQuote] = useState<{ price: number; billed_weight: number } | null>(null);
+
+  useEffect(() => {
+    setServerQuote(null);
+    if (!(Number(weight) > 0)) return;
+
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(QUOTE_API_URL, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ weight: Number(weight), length, width, height }),
+          signal: controller.signal
+        });
+        if (response.ok) setServerQuote(await response.json());
+      } catch (error) {
+        if (!controller.signal.aborted) console.error('Ошибка расчёта стоимости:', error);
+      }
+    }, 300);
+
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [weight, length, width, height]);
 
   const calculateVolumetricWeight = () => {
     if (!length || !width || !height) return 0;
@@ -30,8 +58,8 @@ const Calculator = () => {
   };
 
   const volumetricWeight = calculateVolumetricWeight();
-  const actualWeight = Math.max(Number(weight) || 0, volumetricWeight);
-  const price = calculatePrice();
+  const actualWeight = serverQuote?.billed_weight ?? Math.max(Number(weight) || 0, volumetricWeight);
+  const price = serverQuote?.price ?? calculatePrice();
 
   return (
     <div className="py-16 bg-gradient-to-br from-blue-50 to-orange-50">
@@ -8,17 +8,11 @@ import Icon from '@/components/ui/icon';
 import { toast } from 'sonner';
 import FadeInSection from '@/components/FadeInSection';
 
-interface Order {
-  id: string;
+interface TrackedOrder {
   order_number: string;
-  recipient_name: string;
-  recipient_phone: string;
-  delivery_address: string;
-  weight: number;
-  price: number;
-  delivery_type: 'home' | 'pickup';
   status: string;
-  created_at: string;
+  status_label: string;
+  updated_at: string;
   qr_code?: string;
 }
 
@@ -42,7 +36,7 @@ const statusColors: Record<OrderStatus, string> = {
 
 const OrderTracking = () => {
   const [searchQuery, setSearchQuery] = useState('');
-  const [foundOrder, setFoundOrder] = useState<Order | null>(null);
+  const [foundOrder, setFoundOrder] = useState<TrackedOrder | null>(null);
   const [loading, setLoading] = useState(false);
   const [imageFile, setImageFile] = useState<File | null>(null);
 
@@ -54,7 +48,7 @@ const OrderTracking = () => {
 
     setLoading(true);
     try {
-      const response = await fetch(`https://functions.poehali.dev/4460be83-87c8-4715-bfcb-94d474d9b10f?order_number=${searchQuery}`);
+      const response = await fetch(`https://functions.poehali.dev/4460be83-87c8-4715-bfcb-94d474d9b10f?track=${encodeURIComponent(searchQuery.trim())}`);
       const data = await response.json();
 
       if (response.ok && data) {
@@ -164,33 +158,14 @@ const OrderTracking = () => {
                         Заказ {foundOrder.order_number}
                       </div>
                       <div className="text-sm text-muted-foreground">
-                        {new Date(foundOrder.created_at).toLocaleDateString('ru-RU')}
+                        Обновлён {new Date(foundOrder.updated_at).toLocaleDateString('ru-RU')}
                       </div>
                     </div>
-                    <Badge className={statusColors[foundOrder.status as OrderStatus]}>
-                      {statusLabels[foundOrder.status as OrderStatus]}
+                    <Badge className={statusColors[foundOrder.status as OrderStatus] ?? 'bg-gray-100 text-gray-800'}>
+                      {foundOrder.status_label ?? statusLabels[foundOrder.status as OrderStatus]}
                     </Badge>
                   </div>
 
-                  <div className="grid md:grid-cols-2 gap-4 mb-4">
-                    <div className="space-y-2">
-                      <div className="text-sm text-muted-foreground">Получатель</div>
-                      <div className="font-semibold">{foundOrder.recipient_name}</div>
-                    </div>
-                    <div className="space-y-2">
-                      <div className="text-sm text-muted-foreground">Телефон</div>
-                      <div className="font-semibold">{foundOrder.recipient_phone}</div>
-                    </div>
-                    <div className="space-y-2">
-                      <div className="text-sm text-muted-foreground">Вес</div>
-                      <div className="font-semibold">{foundOrder.weight} кг</div>
-                    </div>
-                    <div className="space-y-2">
-                      <div className="text-sm text-muted-foreground">Стоимость</div>
-                      <div className="font-semibold text-primary text-lg">{foundOrder.price}₽</div>
-                    </div>
-                  </div>
-
                   {foundOrder.qr_code && (
                     <div className="mt-4 p-4 bg-white rounded-lg border-2">
                       <div className="flex items-center gap-4">
@@ -62,9 +62,11 @@ const Index = () => {
   const [isLoggedIn, setIsLoggedIn] = useState(false);
   const [isAdmin, setIsAdmin] = useState(false);
   const [currentUser, setCurrentUser] = useState<{id: number, email: string, name: string, is_admin: boolean} | null>(null);
+  const [authToken, setAuthToken] = useState<string | null>(null);
   const [trackingSearch, setTrackingSearch] = useState('');
   const [activeSection, setActiveSection] = useState<'home' | 'tariffs' | 'tracking' | 'cabinet' | 'about' | 'contacts' | 'admin'>('home');
   const [orders, setOrders] = useState<Order[]>([]);
+  const [ordersCursor, setOrdersCursor] = useState<string | null>(null);
   const [pickupPoints, setPickupPoints] = useState<PickupPoint[]>([]);
   const [deliveryPoints, setDeliveryPoints] = useState<DeliveryPoint[]>([]);
   const [calcWeight, setCalcWeight] = useState('');
@@ -108,10 +110,10 @@ const Index = () => {
   useEffect(() => {
     fetchPickupPoints();
     fetchDeliveryPoints();
-    if (currentUser) {
+    if (currentUser && authToken) {
       fetchOrders();
     }
-  }, [currentUser]);
+  }, [currentUser, authToken]);
 
   const fetchPickupPoints = async () => {
     try {
@@ -133,14 +135,18 @@ const Index = () => {
     }
   };
 
-  const fetchOrders = async () => {
+  const fetchOrders = async (cursor?: string) => {
     try {
-      const url = currentUser && !isAdmin 
-        ? `${API_URLS.orders}?user_id=${currentUser.id}` 
-        : API_URLS.orders;
-      const response = await fetch(url);
+      const params = new URLSearchParams();
+      if (currentUser && !isAdmin) params.set('user_id', String(currentUser.id));
+      if (cursor) params.set('cursor', cursor);
+      const query = params.toString();
+      const url = query ? `${API_URLS.orders}?${query}` : API_URLS.orders;
+      const response = await fetch(url, { headers: { 'X-Auth-Token': authToken || '' } });
       const data = await response.json();
-      setOrders(data);
+      const page: Order[] = Array.isArray(data) ? data : data.orders;
+      setOrders(prev => cursor ? [...prev, ...page] : page);
+      setOrdersCursor(Array.isArray(data) ? null : data.next_cursor);
     } catch (error) {
       console.error('Ошибка загрузки заказов:', error);
     }
@@ -172,11 +178,11 @@ const Index = () => {
       
       if (response.ok && data.user) {
         setCurrentUser(data.user);
+        setAuthToken(data.token || null);
         setIsLoggedIn(true);
         setIsAdmin(data.user.is_admin);
         setActiveSection(data.user.is_admin ? 'admin' : 'cabinet');
         toast.success(data.user.is_admin ? 'Добро пожаловать в админ-панель!' : 'Вы успешно вошли в систему');
-        fetchOrders();
       } else {
         toast.error(data.error || 'Ошибка входа');
       }
@@ -189,6 +195,9 @@ const Index = () => {
     setIsLoggedIn(false);
     setIsAdmin(false);
     setCurrentUser(null);
+    setAuthToken(null);
+    setOrders([]);
+    setOrdersCursor(null);
     setActiveSection('home');
     toast.success('Вы вышли из системы');
   };
@@ -204,11 +213,11 @@ const Index = () => {
       
       if (response.ok && data.user) {
         setCurrentUser(data.user);
+        setAuthToken(data.token || null);
         setIsLoggedIn(true);
         setIsAdmin(data.user.is_admin);
         setActiveSection('cabinet');
         toast.success('Регистрация успешна!');
-        fetchOrders();
       } else {
         toast.error(data.error || 'Ошибка регистрации');
       }
@@ -801,6 +810,11 @@ const Index = () => {
                     </CardContent>
                   </Card>
                 ))}
+                {ordersCursor && (
+                  <Button variant="outline" className="w-full" onClick={() => fetchOrders(ordersCursor)}>
+                    Загрузить ещё
+                  </Button>
+                )}
               </div>
             )}
           </CardContent>
@@ -843,7 +857,7 @@ const Index = () => {
                             try {
                               await fetch(API_URLS.orders, {
                                 method: 'PUT',
-                                headers: { 'Content-Type': 'application/json' },
+                                headers: { 'Content-Type': 'application/json', 'X-Auth-Token': authToken || '' },
                                 body: JSON.stringify({ order_id: order.id, status: newStatus })
                               });
                               fetchOrders();
@@ -866,6 +880,11 @@ const Index = () => {
                     </CardContent>
                   </Card>
                 ))}
+                {ordersCursor && (
+                  <Button variant="outline" className="w-full" onClick={() => fetchOrders(ordersCursor)}>
+                    Загрузить ещё
+                  </Button>
+                )}
               </CardContent>
             </Card>
           </TabsContent>
@@ -1032,7 +1051,7 @@ const Index = () => {
       {activeSection === 'admin' && isAdmin && (
         <div className="pt-20 container mx-auto px-4">
           <h2 className="text-4xl font-bold mb-8">Админ-панель</h2>
-          <AdminPanel />
+          <AdminPanel authToken={authToken} />
         </div>
       )}
 